@@ -0,0 +1,191 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+Benchmarks for the vmsn Parser, run against synthetic snapshots written by vmsn_writer.
+
+measures: opening a file, group and tag lookup latency, building the memory regions (PhysicalMemory, which is
+what the Volatility address space's read_regions does), and sequential and random guest memory read throughput.
+results can be saved as json (--save) and compared against a saved baseline (--baseline).
+
+--latency adds a delay to every read of the file, simulating network storage, and --block-size reads it through a block cache.
+
+usage: python bench_vmsn.py [--memory-size MiB] [--regions N] [--groups N] [--tags N] [--compressed] [--baseline file.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+
+# the vmsn/vmss parser
+import vmsn
+import vmsn_writer
+from latency_file import LatencyFile
+
+_clock = getattr(time, "perf_counter", time.time)
+
+def _timeit(func, repeat):
+    "returns the average seconds per call"
+    start = _clock()
+    for _ in range(0, repeat):
+        func()
+    return (_clock() - start) / repeat
+
+def run(path, args):
+    "runs all benchmarks against the snapshot at path, returning {name: (value, unit)}"
+    results = {}
+    parser_args = {"use_mmap": not args.no_mmap, "block_size": args.block_size * 1024}
+
+    def open_file():
+        # --latency simulates network storage, where every read of the file costs a round trip
+        fh = open(path, "rb")
+        return LatencyFile(fh, args.latency / 1000.0) if args.latency else fh
+
+    def open_parser():
+        fh = open_file()
+        vmsn.Parser(fh, **parser_args)
+        fh.close()
+    results["open"] = (_timeit(open_parser, args.repeat) * 1e6, "us")
+
+    fh = open_file()
+    parser = vmsn.Parser(fh, **parser_args)
+    results["group_lookup"] = (_timeit(lambda: parser["memory"], args.repeat * 10) * 1e6, "us")
+
+    # cold tag lookups include building the group's tag index
+    def cold_tag_lookup():
+        cold = vmsn.Parser(fh, **parser_args)
+        cold["cpu"]["CR"][0][3]
+    results["tag_lookup_cold"] = (_timeit(cold_tag_lookup, args.repeat) * 1e6, "us")
+    results["tag_lookup"] = (_timeit(lambda: parser["cpu"]["CR"][0][3], args.repeat * 10) * 1e6, "us")
+    if args.groups and args.tags:
+        group = parser["group0"]
+        names = [(tag_info.name, tag_info.indices) for tag_info in group.tags() if tag_info.name.startswith("tag")]
+        def lookup_all():
+            for name, indices in names:
+                tag = group[name]
+                for index in indices:
+                    tag = tag[index]
+        results["tag_lookup_all"] = (_timeit(lookup_all, max(1, args.repeat // 10)) / max(1, len(names)) * 1e6, "us/tag")
+
+    results["read_regions"] = (_timeit(lambda: vmsn.PhysicalMemory(vmsn.Parser(fh, **parser_args)), args.repeat) * 1e3, "ms")
+
+    memory = vmsn.PhysicalMemory(parser)
+    tag = memory.tag
+    chunk = 1024 * 1024
+    start = _clock()
+    for offset in range(0, tag.size, chunk):
+        tag.read(offset, chunk)
+    results["sequential_read"] = (tag.size / 1048576.0 / max(_clock() - start, 1e-9), "MiB/s")
+
+    rng = random.Random(0)
+    pages = [memory_offset + rng.randrange(0, length // vmsn.PAGE_SIZE) * vmsn.PAGE_SIZE
+             for memory_offset, _, length in [rng.choice(memory.runs) for _ in range(0, args.random_reads)]]
+    start = _clock()
+    for page in pages:
+        memory.read(page, vmsn.PAGE_SIZE)
+    elapsed = max(_clock() - start, 1e-9)
+    results["random_read"] = (len(pages) / elapsed, "pages/s")
+
+    start = _clock()
+    memory.read_many([(page, vmsn.PAGE_SIZE) for page in pages])
+    results["random_read_many"] = (len(pages) / max(_clock() - start, 1e-9), "pages/s")
+
+    if parser.block_cache is not None:
+        block_cache = parser.block_cache
+        sys.stderr.write("block cache: {0:.1%} hit rate, {1} hits, {2} misses, {3} blocks read ahead\n".format(
+                         block_cache.hit_rate(), block_cache.hits, block_cache.misses, block_cache.readahead))
+    parser.close()
+    return results
+
+# for these results higher is better, lower is better for all others
+_THROUGHPUTS = ("MiB/s", "pages/s")
+
+def report(results, baseline = None, stream = sys.stdout):
+    for name in sorted(results):
+        value, unit = results[name]
+        line = "{0:20} {1:14.2f} {2:8}".format(name, value, unit)
+        if baseline and name in baseline:
+            base = baseline[name][0]
+            if base:
+                ratio = value / base if unit in _THROUGHPUTS else base / value
+                line += "  {0:6.2f}x baseline ({1:.2f})".format(ratio, base)
+        stream.write(line + "\n")
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark the vmsn parser against synthetic snapshots")
+    arg_parser.add_argument("--version", type=int, default=2, choices=sorted(vmsn_writer.VERSION_MAGICS), help="file format version")
+    arg_parser.add_argument("--memory-size", type=int, default=256, help="guest memory size in MiB (written sparse)")
+    arg_parser.add_argument("--regions", type=int, default=64, help="number of memory regions")
+    arg_parser.add_argument("--vcpus", type=int, default=4)
+    arg_parser.add_argument("--groups", type=int, default=8, help="number of filler groups")
+    arg_parser.add_argument("--tags", type=int, default=2000, help="tags per filler group")
+    arg_parser.add_argument("--depth", type=int, default=2, choices=(0, 1, 2, 3), help="index depth of filler tags")
+    arg_parser.add_argument("--large-tag", type=int, default=0, help="size of a large tag in every filler group (bytes)")
+    arg_parser.add_argument("--compressed", action="store_true", help="compress the memory (and large) tags")
+    arg_parser.add_argument("--compress-block", type=int, default=None, help="compress every this many bytes separately")
+    arg_parser.add_argument("--no-mmap", action="store_true", help="benchmark the file handle read path")
+    arg_parser.add_argument("--block-size", type=int, default=0, help="read the file through a block cache of this block size (KiB)")
+    arg_parser.add_argument("--latency", type=float, default=0, help="add this many milliseconds to every file read (see LatencyFile)")
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--random-reads", type=int, default=20000)
+    arg_parser.add_argument("--file", help="benchmark an existing snapshot instead of a synthetic one")
+    arg_parser.add_argument("--save", help="save the results as json")
+    arg_parser.add_argument("--baseline", help="compare against results saved with --save")
+    args = arg_parser.parse_args(argv)
+
+    tmp_dir = None
+    if args.file:
+        path = args.file
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="vmsn_bench")
+        path = os.path.join(tmp_dir, "bench.vmss")
+        start = _clock()
+        with open(path, "wb") as fh:
+            vmsn_writer.build_snapshot(fh, version=args.version, vcpus=args.vcpus, memory_size=args.memory_size * 1048576,
+                                       regions=args.regions, groups=args.groups, tags_per_group=args.tags,
+                                       index_depth=args.depth, large_tag_size=args.large_tag,
+                                       compressed=args.compressed, compress_block=args.compress_block)
+        sys.stderr.write("wrote {0} in {1:.2f}s\n".format(path, _clock() - start))
+
+    try:
+        results = run(path, args)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=1, sort_keys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+A file wrapper simulating network storage, for benchmarking and testing the vmsn Parser's block cache.
+"""
+
+import os
+import time
+
+class LatencyFile():
+    """Wraps a file object, sleeping latency seconds on every read like a file on network storage would.
+    it has no fileno, so a Parser can't map it or use pread, and reads it with seek and read calls.
+    reads and bytes_read count the read calls and the bytes they returned"""
+    def __init__(self, fh, latency = 0.001):
+        self.fh = fh
+        self.mode = fh.mode
+        self.latency = latency
+        self.reads = 0
+        self.bytes_read = 0
+
+    def read(self, size = -1):
+        time.sleep(self.latency)
+        data = self.fh.read(size)
+        self.reads += 1
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset, whence = os.SEEK_SET):
+        return self.fh.seek(offset, whence)
+
+    def tell(self):
+        return self.fh.tell()
+
+    def close(self):
+        self.fh.close()
@@ -30,16 +30,48 @@ import struct
 import volatility.addrspace as addrspace
 import volatility.debug as debug
 import os
+import atexit
+import weakref
+import logging
 
 # the vmsn/vmss parser
 import vmsn
 
 PAGE_SIZE = 4096
 
+class _DebugHandler(logging.Handler):
+    "forwards the records of the parser's vmsn logger to Volatility's debug output"
+    def emit(self, record):
+        debug.debug(self.format(record))
+
+_debug_handler = None
+
+def _forward_logging():
+    # the parser only formats its debug messages when the logger is enabled for them, so follow Volatility's --debug
+    global _debug_handler
+    if _debug_handler is None:
+        _debug_handler = _DebugHandler()
+        vmsn.logger.addHandler(_debug_handler)
+    enabled = getattr(getattr(debug, "config", None), "DEBUG", 0)
+    vmsn.logger.setLevel(logging.DEBUG if enabled else logging.WARNING)
+
+def _report_at_exit(space_ref):
+    # Volatility doesn't close its address spaces, so this is where their read counters are reported
+    space = space_ref()
+    if space is not None and not space.closed:
+        space.report()
+
 class VMWareSnapshotFile(addrspace.RunBasedAddressSpace):
     """ This AS supports VMware snapshot files (*.VMSN;*.VMSS).
     It uses the vmsn Parser class for vmsn/vmss file parsing,
-    and provides the read interface used by the Volatility framework"""
+    and provides the read interface used by the Volatility framework.
+
+    read and zread don't go through RunBasedAddressSpace's per run loop: a read held in one place of the memory tag
+    (any number of pages, across runs that are adjacent in the file as well) is a single read of the file's memory map,
+    and other reads are merged into as few file reads as possible by PhysicalMemory.read_many.
+
+    compressed memory tags are supported as well, reads are decompressed by the parser. their runs then hold offsets within
+    the (decompressed) memory tag instead of file offsets, and translate returns None, as there's no file offset to return"""
     order = 30
     name = "VMware Snapshot File"
     
@@ -49,6 +81,16 @@ class VMWareSnapshotFile(addrspace.RunBasedAddressSpace):
 
         # init base address space
         self.base = base
+        start = vmsn._clock()
+        _forward_logging()
+
+        ## read counters (see read_counters), reported by report: after setup, on close and when the process exits
+        # all reads, bytes read, reads served by a single file read and reads of unmapped memory
+        self.reads = 0
+        self.bytes_read = 0
+        self.single_reads = 0
+        self.unmapped_reads = 0
+        self.closed = False
 
         # start parsing the underlying AS, hopefully it has a VMSN data structure
         try:
@@ -64,43 +106,20 @@ class VMWareSnapshotFile(addrspace.RunBasedAddressSpace):
            "Couldn't find actual memory in file. Older vmware versions saved memory in *.vmem files.")
 
         self.read_regions()
+        debug.debug("setup took {0:.3f}s".format(vmsn._clock() - start))
+        self.report()
+        atexit.register(_report_at_exit, weakref.ref(self))
 
     def read_regions(self):
-        memory = self.parser["memory"]
-
-        # find the "regionsCount" tag, if it exists
-        #  read regions one by one and create runs for them
-        if "regionsCount" in memory and memory["regionsCount"].read_long() > 0:
-            region_count = memory["regionsCount"].read_long()
-            debug.debug("Read region count from file: " + str(region_count))
-
-            for region_i in range(0, region_count):
-                # create a new run, according to Previous Page Number, Page Number and Size
-                self.assert_as(region_i in memory["regionPPN"]
-                                 and region_i in memory["regionPageNum"]
-                                 and region_i in memory["regionSize"],
-			       "File is currept. Internal data memory region #{0} is missing.".format(region_i))
-
-                memory_offset = memory["regionPPN"][region_i].read_long() * PAGE_SIZE
-                file_offset = memory["regionPageNum"][region_i].read_long() * PAGE_SIZE
-                              + memory["Memory"][0][0].data_offset
-                length = memory["regionSize"][region_i].read_long()*PAGE_SIZE
-
-                # add a new run for the current vmss region
-                self.runs.append((memory_offset, file_offset, length))
-        # if "regionsCount" tag is missing
-        #  assume there's only one memory region, and that is contains all available memory space
+        # translate the regions in the "memory" group into runs.
+        #  if the "regionsCount" tag is missing, there's only one memory region and it contains all available memory space
         #  seen this in with several vmss files
-        else:
-            # create a single region according to the entire memory space.
-            # the memory space begins at virtual address zero,
-            # and has a size equal to the memory region's
-            memory_offset = 0
-            file_offset = 0 + memory["Memory"][0][0].data_offset
-            length = memory["Memory"][0][0].data_size
-
-            # add a new run for the current vmss region
-            self.runs.append((memory_offset, file_offset, length))
+        try:
+            self.memory = vmsn.PhysicalMemory(self.parser)
+        except vmsn.ParserException as e:
+            self.as_assert(False, e)
+        # compressed memory has no file offsets, and is only read through the parser (see _read)
+        self.runs = self.memory.file_runs() if not self.memory.tag.compressed else list(self.memory.runs)
 
         # print debug data regarding the regions found
         debug.debug("RegionCount: {0}".format(len(self.runs)))
@@ -112,6 +131,52 @@ class VMWareSnapshotFile(addrspace.RunBasedAddressSpace):
         self.dtb = self.parser["cpu"]["CR"][0][3].read_long()
         debug.debug("dtb: {0:x}".format(self.dtb))
 
+    def translate(self, addr):
+        "returns the file offset of a physical address, None if it isn't mapped or the memory tag is compressed"
+        # binary search over the regions instead of scanning the runs list
+        offset = self.memory.translate(addr)
+        if offset is None or self.memory.tag.compressed:
+            return None
+        return self.memory.tag.data_offset + offset
+
+    def is_valid_address(self, addr):
+        # doesn't need a file offset, so it holds for compressed memory as well
+        return self.memory.is_valid_address(addr)
+
+    def _read(self, addr, length, pad):
+        self.reads += 1
+        self.bytes_read += length
+        segments = list(self.memory.segments(addr, length))
+        if any(tag_offset is None for _, tag_offset, _ in segments):
+            self.unmapped_reads += 1
+            if not pad:
+                return None
+        elif all(segments[i][1] + segments[i][2] == segments[i + 1][1] for i in range(0, len(segments) - 1)):
+            # held in one place in the memory tag
+            self.single_reads += 1
+            return self.memory.tag.read(segments[0][1] if segments else 0, length)
+        return self.memory.read_many([(addr, length)])[0]
+
+    def read(self, addr, length):
+        "reads physical memory, returns None if any part of it isn't mapped"
+        return self._read(addr, length, False)
+
+    def zread(self, addr, length):
+        "reads physical memory, unmapped parts are filled with zeros"
+        return self._read(addr, length, True)
+
+    def read_counters(self):
+        "returns the read counters as a dict"
+        return {"reads": self.reads, "bytes_read": self.bytes_read, "single_reads": self.single_reads,
+                "unmapped_reads": self.unmapped_reads}
+
+    def report(self):
+        "writes the read counters to the debug output"
+        debug.debug("reads: {reads} ({bytes_read} bytes), single file reads: {single_reads}, unmapped: {unmapped_reads}".format(
+                    **self.read_counters()))
+
     def close(self):
+        self.report()
+        self.closed = True
         self.parser.close()
         self.base.close()
@@ -37,63 +37,704 @@ but designed to be used by other products/software as well.
 import struct
 import os
 import sys
+import mmap
+import threading
+import zlib
+import json
+import hashlib
+import binascii
+import logging
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, OrderedDict
 
-# a bit ugly but allows this script to be used outside of Volatility without any changes
-try:
-    import volatility.debug.debug as debug
-except ImportError:
-    debug = lambda string: sys.stdout.write(string+"\n")
+# debug output goes through the "vmsn" logger of the standard logging module (the Volatility interface forwards it to
+# Volatility's debug output). messages are only formatted when debug logging is enabled, so a debug call in a hot path
+# costs a single level check when it isn't.
+logger = logging.getLogger("vmsn")
+logger.addHandler(logging.NullHandler())
+
+def debug(message, *args, **kwargs):
+    "logs a debug message, formatted with str.format(*args, **kwargs) only if debug logging is enabled"
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message.format(*args, **kwargs) if args or kwargs else message)
+
+# the most precise clock available, for ParserStats timings
+_clock = getattr(time, "perf_counter", time.time)
 
 class ParserException(Exception):
     "ParserException is thrown whenever there is an error with parsing the vmsn file"
     pass
 
+class ParserStats():
+    """Counters and timings collected by a Parser created with stats=True, available as parser.stats.
+
+    reads, bytes_read: reads of file data (from the file or its memory map). syscalls, seeks: system calls made to do that
+    (memory map reads don't need any). tags_scanned: tag descriptors read while walking groups' tag lists.
+    index_hits, index_misses: tag lookups served by an existing group tag index, and those that had to build it first.
+    cache_hits, cache_misses: decompressed blocks of compressed tags found in, or missing from, the block cache.
+    index_cache_hits, index_cache_misses: whether the on-disk index cache had a valid entry when the file was opened.
+    times and calls hold the total seconds spent in, and number of calls to, every phase: opening the file, group lookups,
+    tag lookups and data reads (Tag reads).
+    counters are updated without locking, so they are approximate when a parser is used from several threads."""
+    counters = ("reads", "bytes_read", "syscalls", "seeks", "tags_scanned", "index_hits", "index_misses",
+                "cache_hits", "cache_misses", "index_cache_hits", "index_cache_misses")
+    phases = ("open", "group_lookup", "tag_lookup", "data_read")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        for counter in self.counters:
+            setattr(self, counter, 0)
+        self.times = dict((phase, 0.0) for phase in self.phases)
+        self.calls = dict((phase, 0) for phase in self.phases)
+
+    def add_time(self, phase, seconds):
+        self.times[phase] += seconds
+        self.calls[phase] += 1
+
+    def as_dict(self):
+        "returns all counters and timings, i.e. for exporting them as json"
+        stats = dict((counter, getattr(self, counter)) for counter in self.counters)
+        stats["times"] = dict(self.times)
+        stats["calls"] = dict(self.calls)
+        return stats
+
+    def __str__(self):
+        return " ".join("{0}={1}".format(key, value) for key, value in sorted(self.as_dict().items()))
+
 HEADER_SIZE = 12
 GROUP_SIZE = 80
 GROUP_NAME_SIZE = 64
 
-class Tag():
-    def __init__(self, parser, group, name, indices, data_offset, data_size, data_mem_size, compressed):
-        self.parser = parser
+# file format version by header magic
+MAGICS = {0xbed2bed0: 0, 0xbad1bad1: 1, 0xbed2bed2: 2, 0xbed3bed3: 3}
+
+# compressed tags are decompressed and cached in blocks of this size
+COMPRESSED_BLOCK_SIZE = 64 * 1024
+# the decompressor's state is saved every this many (decompressed) bytes, so random reads never decompress more than that
+COMPRESSED_CHECKPOINT_INTERVAL = 16 * 1024 * 1024
+# default memory budget for the cache of decompressed blocks
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+## file block cache (see BlockCache), used for files on slow storage
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_BLOCK_CACHE_SIZE = 32 * 1024 * 1024
+DEFAULT_READAHEAD = 1024 * 1024
+# this many reads in a row that continue each other make a sequential stream, which gets read-ahead
+SEQUENTIAL_READS = 2
+
+# guest memory regions are described in pages
+PAGE_SIZE = 4096
+# reads of nearby pieces (see _coalesce, used by PhysicalMemory.read_many and CpuState) are merged when they are at most this far
+# apart in the file, and never read more than the max at once
+COALESCE_GAP = PAGE_SIZE
+COALESCE_MAX = 16 * 1024 * 1024
+
+## x86 paging, see VirtualMemory
+# (shift, index bits, whether the entry can map a large page) for every paging level, top level first
+PAGING_LEVELS = {
+    "x64": ((39, 9, False), (30, 9, True), (21, 9, True), (12, 9, False)),
+    "pae": ((30, 2, False), (21, 9, True), (12, 9, False)),
+}
+_PTE_PRESENT = 1 << 0
+_PTE_LARGE = 1 << 7
+_PTE_ADDRESS = 0x000ffffffffff000
+_CR4_PAE = 1 << 5
+_EFER_LMA = 1 << 10
+# default sizes of the translation cache (in pages) and the page-table page cache (in bytes)
+DEFAULT_TLB_ENTRIES = 64 * 1024
+DEFAULT_PAGE_TABLE_CACHE = 16 * 1024 * 1024
+
+## cpu register state, see CpuState
+# register families, by the names of the cpu group's tags. tags with any other name are in the OTHER_REGISTERS family
+REGISTER_FAMILIES = {
+    "control": ("CR", "CR64", "XCR0"),
+    "debug": ("DR", "DR64"),
+    "general": ("gpregs", "rip", "eflags", "rflags"),
+    "segment": ("S", "SBASE", "SBASE64", "SLIMIT", "SAR", "GDTRbase", "GDTRlimit", "IDTRbase", "IDTRlimit", "LDTR", "TR"),
+    "msr": ("EFER", "PAT", "KernelGSBase", "STAR", "LSTAR", "CSTAR", "SFMASK", "SYSENTER_CS", "SYSENTER_ESP", "SYSENTER_EIP", "TSC"),
+}
+OTHER_REGISTERS = "other"
+# registers that are per vcpu in every file, which give CpuState its vcpu count (the first one the file has)
+VCPU_REGISTERS = ("CR", "CR64", "rip", "gpregs")
+_REGISTER_FAMILY = dict((name, family) for family, names in REGISTER_FAMILIES.items() for name in names)
+# a register tag with more entries than this (over all vcpus and indices) has no fixed layout, see CpuState
+MAX_REGISTER_ENTRIES = 1024 * 1024
+
+# a tag's descriptor, as found while walking a group's tag list
+TagInfo = namedtuple("TagInfo", "name indices data_offset data_size data_mem_size compressed")
+# tag data longer than this is reported as a size and a hex prefix, see tag_value
+MAX_VALUE_BYTES = 64
+
+# tags have at most 3 indices (the flags byte has 2 bits for the depth)
+MAX_TAG_DEPTH = 3
+# the row TagTable.find returns for partial indices (a MetaTag)
+META_TAG = -1
+# the depth of names whose tags don't all have the same depth, in TagTable.name_depths
+_MIXED_DEPTHS = 0xff
+# where each index goes in a TagTable lookup key, and the zeros padding a row's indices to MAX_TAG_DEPTH
+_INDEX_SHIFTS = (34, 66, 98)
+_INDICES_PADDING = [(0,) * (MAX_TAG_DEPTH - depth) for depth in range(0, MAX_TAG_DEPTH + 1)]
+
+# tag names are interned, so the names of all groups (and files) share a single string each
+_intern = getattr(sys, "intern", None) or intern
+
+# offsets and sizes are kept in arrays of unsigned 64 bit ints. python 2's array only has those where longs are 64 bit,
+# elsewhere they stay lists
+try:
+    array("Q")
+    _QWORD = "Q"
+except ValueError:
+    _QWORD = "L" if array("L").itemsize == 8 else None
+
+# precompiled formats used to decode ints straight out of the file (or the file's memory map)
+_BYTE = struct.Struct('=B')
+_LONG = struct.Struct('=I')
+_LONG_LONG = struct.Struct('=Q')
+# int formats by size, for register tags (see CpuState)
+_INTS = {1: _BYTE, 2: struct.Struct('=H'), 4: _LONG, 8: _LONG_LONG}
+
+_TAG_HEADER = struct.Struct('=BB')
+# a tag's indices, by depth
+_TAG_INDICES = [struct.Struct('={0}I'.format(depth)) for depth in range(0, MAX_TAG_DEPTH + 1)]
+
+# positional reads (pread) don't touch the shared file position. not available on python 2 or windows
+_pread = getattr(os, "pread", None)
+
+# tag names are kept as native strings, so they compare equal to the names users search for
+if bytes is str:
+    _to_str = lambda data: data
+else:
+    _to_str = lambda data: data.decode("latin-1")
+
+class TagTable(object):
+    """The descriptors of all tags of a group, kept as columns: parallel arrays with an entry (row) per tag, in file order.
+
+    names are interned and stored once, rows refer to them by name id. indices are stored MAX_TAG_DEPTH per row (zero padded)
+    along with the depth. lookups go through order, the rows sorted by name id, indices and row, so a name's rows are a
+    single sorted run of it (starting at name_starts[name id]). order_keys packs the first two indices of every row of order
+    into a 64 bit int, which is binary searched (bisect) for the indices. full indices find the tag's row and partial (prefix)
+    ones META_TAG. the first matching tag in file order wins, same as a linear search would: when a name's tags have
+    different depths, a shorter tag can come after a longer one with the same prefix, so these names are looked up in a
+    dict (keyed by an int packing the name id and the indices) instead.
+
+    rows are appended to lists while the table is built, which is faster than growing arrays, finish sorts them and packs
+    them into arrays."""
+    def __init__(self):
+        self.names = []
+        self.name_ids = {}
+        self.name_column = []
+        self.depths = []
+        self.index_column = []
+        self.data_offsets = []
+        self.data_sizes = []
+        self.data_mem_sizes = []
+        self.compressed = []
+        self.order = None
+        self.order_keys = None
+        self.name_starts = None
+        self.name_depths = None
+        self._rows = {}
+
+    def finish(self):
+        "sorts the rows for lookups and packs the columns into arrays, once all rows were appended"
+        name_column = self.name_column
+        depths = self.depths
+        index_column = self.index_column
+        # indices are zero padded, so rows are sorted by depth too for same name and indices
+        keys = [(index_column[start] << 32) | index_column[start + 1] for start in range(0, len(index_column), MAX_TAG_DEPTH)]
+        order = sorted(range(0, len(depths)), key=lambda row: (name_column[row], keys[row], index_column[row * MAX_TAG_DEPTH + 2],
+                                                               depths[row], row))
+
+        ## where every name's run of rows starts in order, and the depth of its tags
+        name_starts = [0] * (len(self.names) + 1)
+        name_depths = [None] * len(self.names)
+        for row, name_id in enumerate(name_column):
+            name_starts[name_id + 1] += 1
+            if name_depths[name_id] is None:
+                name_depths[name_id] = depths[row]
+            elif name_depths[name_id] != depths[row]:
+                name_depths[name_id] = _MIXED_DEPTHS
+        for name_id in range(0, len(self.names)):
+            name_starts[name_id + 1] += name_starts[name_id]
+
+        # the keys of every prefix of the indices mark a meta-tag, built up the same way _key packs them
+        rows = self._rows
+        for row, name_id in enumerate(name_column):
+            if name_depths[name_id] != _MIXED_DEPTHS:
+                continue
+            depth = depths[row]
+            packed = name_id
+            for prefix_depth in range(0, depth):
+                rows.setdefault(packed | (prefix_depth << 32), META_TAG)
+                packed |= index_column[row * MAX_TAG_DEPTH + prefix_depth] << _INDEX_SHIFTS[prefix_depth]
+            rows.setdefault(packed | (depth << 32), row)
+
+        self.order = array("I", order)
+        self.order_keys = [keys[row] for row in order]
+        if _QWORD is not None:
+            self.order_keys = array(_QWORD, self.order_keys)
+        self.name_starts = array("I", name_starts)
+        self.name_depths = array("B", name_depths)
+        self.name_column = array("I", name_column)
+        self.depths = array("B", depths)
+        self.index_column = array("I", index_column)
+        if _QWORD is not None:
+            self.data_offsets = array(_QWORD, self.data_offsets)
+            self.data_sizes = array(_QWORD, self.data_sizes)
+            self.data_mem_sizes = array(_QWORD, self.data_mem_sizes)
+        self.compressed = array("B", self.compressed)
+        return self
+
+    def __len__(self):
+        return len(self.depths)
+
+    @staticmethod
+    def _key(name_id, indices):
+        "packs a name id (32 bits), the depth (2 bits) and the indices (32 bits each) into a single int"
+        key = name_id | (len(indices) << 32)
+        for depth, index in enumerate(indices):
+            key |= index << _INDEX_SHIFTS[depth]
+        return key
+
+    def append(self, name, indices, data_offset, data_size, data_mem_size, compressed):
+        "adds a tag's descriptor as the next row"
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            name = _intern(name)
+            self.names.append(name)
+            self.name_ids[name] = name_id
+
+        depth = len(indices)
+        self.name_column.append(name_id)
+        self.depths.append(depth)
+        index_column = self.index_column
+        index_column.extend(indices)
+        index_column.extend(_INDICES_PADDING[depth])
+        self.data_offsets.append(data_offset)
+        self.data_sizes.append(data_size)
+        self.data_mem_sizes.append(data_mem_size)
+        self.compressed.append(1 if compressed else 0)
+
+    def find(self, name, indices):
+        "returns the row of the tag with this name and indices, META_TAG for partial indices, or None"
+        name_id = self.name_ids.get(name)
+        if name_id is None or len(indices) > MAX_TAG_DEPTH:
+            return None
+        # anything but 32 bit unsigned indices can't match a tag
+        try:
+            for index in indices:
+                if not 0 <= index <= 0xffffffff:
+                    return None
+        except TypeError:
+            return None
+
+        depth = self.name_depths[name_id]
+        if depth == _MIXED_DEPTHS:
+            return self._rows.get(self._key(name_id, indices))
+        query_depth = len(indices)
+        if query_depth > depth:
+            return None
+
+        ## the name's rows starting with the first two indices of the query
+        order_keys = self.order_keys
+        lo = self.name_starts[name_id]
+        hi = self.name_starts[name_id + 1]
+        if query_depth == 1:
+            lo = bisect_left(order_keys, indices[0] << 32, lo, hi)
+            hi = bisect_left(order_keys, (indices[0] + 1) << 32, lo, hi)
+        elif query_depth > 1:
+            key = (indices[0] << 32) | indices[1]
+            lo = bisect_left(order_keys, key, lo, hi)
+            hi = bisect_right(order_keys, key, lo, hi)
+        if query_depth == 3:
+            # and the third one, among those
+            order = self.order
+            index_column = self.index_column
+            third = indices[2]
+            end = hi
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if index_column[order[mid] * MAX_TAG_DEPTH + 2] < third:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == end or index_column[self.order[lo] * MAX_TAG_DEPTH + 2] != third:
+                return None
+        elif lo == hi:
+            return None
+        return self.order[lo] if query_depth == depth else META_TAG
+
+    def name(self, row):
+        return self.names[self.name_column[row]]
+
+    def indices(self, row):
+        start = row * MAX_TAG_DEPTH
+        return tuple(self.index_column[start:start + self.depths[row]])
+
+    def info(self, row):
+        "returns a row as a TagInfo"
+        return TagInfo(self.name(row), self.indices(row), self.data_offsets[row], self.data_sizes[row],
+                       self.data_mem_sizes[row], bool(self.compressed[row]))
+
+    def infos(self):
+        "iterates over all rows as TagInfo"
+        return (self.info(row) for row in range(0, len(self)))
+
+class Tag(object):
+    """A tag holding data. tags are views over a row of their group's TagTable, and hold nothing but the group and the row"""
+    __slots__ = ("group", "row")
+
+    def __init__(self, group, row):
         self.group = group
-        self.name = name
-        self.indices = indices
-        self.data_offset = data_offset
-        self.data_size = data_size
-        self.data_mem_size = data_mem_size
-        self.compressed = compressed
+        self.row = row
+
+    @property
+    def parser(self):
+        return self.group.parser
+
+    @property
+    def name(self):
+        return self.group._index.name(self.row)
+
+    @property
+    def indices(self):
+        return self.group._index.indices(self.row)
+
+    @property
+    def data_offset(self):
+        return self.group._index.data_offsets[self.row]
+
+    @property
+    def data_size(self):
+        return self.group._index.data_sizes[self.row]
+
+    @property
+    def data_mem_size(self):
+        return self.group._index.data_mem_sizes[self.row]
+
+    @property
+    def compressed(self):
+        return bool(self.group._index.compressed[self.row])
+
+    def info(self):
+        "returns the tag's descriptor as a TagInfo"
+        return self.group._index.info(self.row)
+
+    @property
+    def size(self):
+        "the size of the tag's data as returned by read, which is the decompressed size for compressed tags"
+        return self.data_mem_size if self.compressed else self.data_size
 
     # methods used to read the tag
-    def read(self, offset = 0, size = -1):
-        if size == -1:
-            size = self.data_size - offset
+    def read(self, offset = 0, size = -1, copy = True):
+        """Reads the tag's data. when copy is False a memoryview is returned instead of bytes,
+        which is a zero-copy slice of the file when the parser has it memory mapped.
+        compressed tags are transparently decompressed, offset and size are then relative to the decompressed data.
+        reads are bounded by the tag's data, and never return bytes of the following tags"""
+        # read the row's columns once
+        table = self.group._index
+        compressed = table.compressed[self.row]
+        tag_size = table.data_mem_sizes[self.row] if compressed else table.data_sizes[self.row]
+        if size == -1 or size > tag_size - offset:
+            size = max(0, tag_size - offset)
+        parser = self.group.parser
+        stats = parser.stats
+        if stats is not None:
+            start = _clock()
         #print("base addr: {0:X}, paddr: {1:X}, size: {2:X}".format(self.data_offset, self.data_offset + offset, size))
-        return self.parser.read(self.data_offset + offset, size)
+        if compressed:
+            data = parser.compressed_data(self).read(offset, size)
+            if not copy:
+                data = memoryview(data)
+        elif not copy:
+            data = parser.view(table.data_offsets[self.row] + offset, size)
+        else:
+            data = parser.reada(table.data_offsets[self.row] + offset, size)
+        if stats is not None:
+            stats.add_time("data_read", _clock() - start)
+        return data
+
+    def _read_int(self, fmt, read_type):
+        if self.size < fmt.size:
+            raise TypeError("Attempt to read tag at {offset} with size {tag_size} as {read_type} {read_size}".format(offset=self.data_offset, tag_size=self.size, read_type=read_type, read_size=fmt.size))
+        if self.compressed:
+            (val,) = fmt.unpack(self.read(0, fmt.size))
+            return val
+        parser = self.group.parser
+        stats = parser.stats
+        if stats is None:
+            return parser._unpacka(fmt, self.group._index.data_offsets[self.row])
+        start = _clock()
+        val = parser._unpacka(fmt, self.group._index.data_offsets[self.row])
+        stats.add_time("data_read", _clock() - start)
+        return val
  
     def read_offset(self):
-        if self.data_size < self.parser._offset_size:
-            raise TypeError("Attempt to read tag at {offset} with size {tag_size} as {read_type} {read_size}".format(offset=self.data_offset, tag_size=self.data_size, read_type="offset", read_size=self.parser._offset_size))
-        return self.parser.reada_offset(self.data_offset)
+        return self._read_int(_LONG if self.parser.offset_size == 4 else _LONG_LONG, "offset")
     
     def read_long_long(self):
-        if self.data_size < 8:
-            raise TypeError("Attempt to read tag at {offset} with size {tag_size} as {read_type} {read_size}".format(offset=self.data_offset, tag_size=self.data_size, read_type="long long", read_size=8))
-        return self.parser.reada_long_long(self.data_offset)
+        return self._read_int(_LONG_LONG, "long long")
         
     def read_long(self):
-        if self.data_size < 4:
-            raise TypeError("Attempt to read tag at {offset} with size {tag_size} as {read_type} {read_size}".format(offset=self.data_offset, tag_size=self.data_size, read_type="long", read_size=4))
-        return self.parser.reada_long(self.data_offset)
+        return self._read_int(_LONG, "long")
         
     def read_byte(self):
-        if self.data_size < 1:
-            raise TypeError("Attempt to read tag at {offset} with size {tag_size} as {read_type} {read_size}".format(offset=self.data_offset, tag_size=self.data_size, read_type="byte", read_size=1))
-        return self.parser.reada_byte(self.data_offset)
+        return self._read_int(_BYTE, "byte")
 
     def __str__(self):
-        return str(self.parent) + self.name
+        return str(self.group) + self.name
+
+def tag_value(tag, max_bytes = MAX_VALUE_BYTES):
+    "decodes a tag's data for json output: an int for 1, 2, 4 and 8 byte tags, otherwise its size and (a prefix of) its data as hex"
+    size = tag.size
+    if size in _INTS:
+        (value,) = _INTS[size].unpack(tag.read(0, size))
+        return value
+    data = tag.read(0, min(size, max_bytes))
+    return {"size": size, "hex": binascii.hexlify(data).decode("ascii")}
         
-class MetaTag():
+class _LRUCache():
+    """a thread safe least recently used cache, bounded by the total size (in bytes) of the values it holds.
+    sizeof gives a value's size, passing sizeof=lambda value: 1 bounds the number of entries instead"""
+    def __init__(self, budget, sizeof = len):
+        self.budget = budget
+        self.sizeof = sizeof
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                self._items[key] = value
+            return value
+
+    def put(self, key, value):
+        sizeof = self.sizeof
+        if sizeof(value) > self.budget:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= sizeof(old)
+            self._items[key] = value
+            self.size += sizeof(value)
+            while self.size > self.budget:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= sizeof(evicted)
+
+class BlockCache():
+    """Caches file data in aligned blocks of block_size bytes with LRU eviction, within a memory budget of budget bytes.
+
+    made for files on network storage, where every read of the file costs a round trip: read turns any read into reads of whole
+    blocks, and reads all missing blocks of a request at once. once SEQUENTIAL_READS reads in a row each continue the block the
+    previous one ended in (walking a group's tag list, streaming a tag), misses also read readahead bytes (at most half the budget)
+    of the following blocks.
+    read_file(addr, size) reads the file itself. reads larger than half the budget bypass the cache.
+
+    hits and misses count blocks found in, or missing from, the cache, readahead counts the blocks read ahead of time.
+    counters are updated without locking, so they are approximate when the cache is used from several threads."""
+    def __init__(self, read_file, block_size = DEFAULT_BLOCK_SIZE, budget = DEFAULT_BLOCK_CACHE_SIZE, readahead = DEFAULT_READAHEAD):
+        self._read_file = read_file
+        self.block_size = block_size
+        # read-ahead is bounded by half the budget, so the blocks read ahead never evict the ones just read (or each other)
+        self.readahead_blocks = min(readahead, budget // 2) // block_size
+        self._max_blocks = max(1, budget // block_size // 2)
+        self._blocks = _LRUCache(budget)
+        # the block the previous read ended in, and how many reads in a row continued the one before them
+        self._last = None
+        self._streak = 0
+        self.hits = 0
+        self.misses = 0
+        self.readahead = 0
+
+    def hit_rate(self):
+        "the fraction of blocks served from the cache"
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    def read(self, addr, size):
+        if size <= 0:
+            return b""
+        block_size = self.block_size
+        first = addr // block_size
+        last = (addr + size - 1) // block_size
+
+        if self._last is not None and self._last <= first <= self._last + 1:
+            self._streak += 1
+        else:
+            self._streak = 0
+        self._last = last
+
+        if last - first >= self._max_blocks:
+            self.misses += last - first + 1
+            return self._read_file(addr, size)
+
+        blocks = []
+        block = first
+        while block <= last:
+            data = self._blocks.get(block)
+            if data is not None:
+                self.hits += 1
+                blocks.append(data)
+                block += 1
+                continue
+
+            ## read all missing blocks up to the next cached one at once, and the following ones for sequential streams
+            end = block + 1
+            while end <= last and self._blocks.get(end) is None:
+                end += 1
+            ahead = self.readahead_blocks if self._streak >= SEQUENTIAL_READS else 0
+            data = self._read_file(block * block_size, (end - block + ahead) * block_size)
+            self.misses += end - block
+
+            for data_offset in range(0, len(data), block_size):
+                piece = data[data_offset:data_offset + block_size]
+                self._blocks.put(block + data_offset // block_size, piece)
+                if data_offset < (end - block) * block_size:
+                    blocks.append(piece)
+                else:
+                    self.readahead += 1
+            if len(data) < (end - block) * block_size:
+                # end of file
+                break
+            block = end
+
+        data = b"".join(blocks)
+        offset = addr - first * block_size
+        return data[offset:offset + size]
+
+class CompressedData():
+    """Random access to the decompressed data of a compressed tag (data size code 63).
+
+    The compression format isn't documented either. the data decompresses as zlib, either as a single stream or as several streams
+    one after the other, which is what this class assumes.
+    Decompressing from the start for every read is way too slow for memory tags, so the first read walks the whole data once and
+    saves checkpoints: the input offset where every zlib stream starts, and a copy of the decompressor's state every
+    COMPRESSED_CHECKPOINT_INTERVAL bytes inside long streams. a read then only decompresses from the nearest checkpoint.
+    decompressed blocks of COMPRESSED_BLOCK_SIZE bytes are kept in the parser's LRU cache, so nearby reads don't decompress again."""
+    _chunk_size = 64 * 1024
+
+    def __init__(self, parser, data_offset, data_size, data_mem_size):
+        self.parser = parser
+        self.data_offset = data_offset
+        self.data_size = data_size
+        self.data_mem_size = data_mem_size
+
+        # checkpoint output offsets, and (input offset, decompressor state or None at a stream start) for each one
+        self._checkpoints = None
+        self._states = None
+        self._lock = threading.Lock()
+
+    def read(self, offset, size):
+        size = max(0, min(size, self.data_mem_size - offset))
+        if size == 0:
+            return b""
+        if self._checkpoints is None:
+            self._build_index()
+
+        first = offset // COMPRESSED_BLOCK_SIZE
+        last = (offset + size - 1) // COMPRESSED_BLOCK_SIZE
+        blocks = [self.parser._cache.get((self.data_offset, block)) for block in range(first, last + 1)]
+        stats = self.parser.stats
+        if stats is not None:
+            misses = blocks.count(None)
+            stats.cache_misses += misses
+            stats.cache_hits += len(blocks) - misses
+        if None in blocks:
+            # decompress everything from the first missing block in one go
+            missing = first + blocks.index(None)
+            loaded = self._load(missing, last)
+            blocks = [block_data if block_data is not None else loaded[block] for block, block_data in zip(range(first, last + 1), blocks)]
+
+        data = b"".join(blocks)
+        start = offset - first * COMPRESSED_BLOCK_SIZE
+        return data[start:start + size]
+
+    def _load(self, first, last):
+        "decompresses blocks first to last (inclusive) starting at the nearest checkpoint, and caches every block on the way"
+        i = bisect_right(self._checkpoints, first * COMPRESSED_BLOCK_SIZE) - 1
+        in_pos, obj = self._states[i]
+        loaded = {}
+        for out_pos, block_data, _, _ in self._blocks(self._checkpoints[i], in_pos, obj.copy() if obj is not None else None):
+            block = out_pos // COMPRESSED_BLOCK_SIZE
+            self.parser._cache.put((self.data_offset, block), block_data)
+            if block >= first:
+                loaded[block] = block_data
+            if block == last:
+                break
+        return loaded
+
+    def _build_index(self):
+        with self._lock:
+            if self._checkpoints is not None:
+                return
+
+            checkpoints = [0]
+            states = [(self.data_offset, None)]
+            for out_pos, block_data, in_pos, obj in self._blocks(0, self.data_offset, None):
+                next_pos = out_pos + len(block_data)
+                if next_pos >= self.data_mem_size:
+                    break
+                if obj is None:
+                    # the next block starts a new zlib stream, no state to keep
+                    checkpoints.append(next_pos)
+                    states.append((in_pos, None))
+                elif next_pos - checkpoints[-1] >= COMPRESSED_CHECKPOINT_INTERVAL:
+                    checkpoints.append(next_pos)
+                    states.append((in_pos, obj.copy()))
+
+            debug("indexed compressed data at {offset}: {count} checkpoints", offset=self.data_offset, count=len(checkpoints))
+            self._states = states
+            self._checkpoints = checkpoints
+
+    def _blocks(self, out_pos, in_pos, obj):
+        """decompresses forward from a checkpoint, yielding (output offset, block data, input offset, decompressor) for every block.
+        the input offset and decompressor are the state right after the block. the decompressor is None if a new zlib stream starts there"""
+        end = self.data_offset + self.data_size
+        pending = b""
+        while out_pos < self.data_mem_size:
+            want = min(COMPRESSED_BLOCK_SIZE - out_pos % COMPRESSED_BLOCK_SIZE, self.data_mem_size - out_pos)
+            chunks = []
+            while want > 0:
+                if obj is None:
+                    obj = zlib.decompressobj()
+                if not pending and in_pos < end:
+                    pending = self.parser.reada(in_pos, min(self._chunk_size, end - in_pos))
+                    in_pos += len(pending)
+
+                try:
+                    data = obj.decompress(pending, want)
+                except zlib.error as e:
+                    raise ParserException("Failed decompressing tag data at {0}".format(self.data_offset), e)
+
+                if obj.unused_data:
+                    # the stream ended and another one follows
+                    pending = obj.unused_data
+                    obj = None
+                else:
+                    pending = obj.unconsumed_tail
+                    if not data and in_pos >= end:
+                        if getattr(obj, "eof", False) or not pending:
+                            raise ParserException("Compressed tag data at {0} ended early".format(self.data_offset), out_pos)
+
+                want -= len(data)
+                chunks.append(data)
+
+            block_data = b"".join(chunks)
+            if obj is not None and getattr(obj, "eof", False):
+                obj = None
+            # the state is described by where the unconsumed input starts
+            yield out_pos, block_data, in_pos - len(pending), obj
+            out_pos += len(block_data)
+
+class MetaTag(object):
     """A metatag is what i use to implement an intermidiate array level.
     for example, when trying to access the parserObj["memory"]["Memory"][0][0] data, the following logic flow will execute:
     a. the "memory" group will be searched by a Parser obejct, and a Group object will be returned.
@@ -103,124 +744,171 @@ class MetaTag():
     
     This design was choosen because it is more readable for users of the class, as it provides a more intuitive structure.
     In addition, this structure allows to save each intermidiate point inside the tree for easier access with fewer searches."""
-    def __init__(self, parser, group, name, indices):
-        self.parser = parser
+    __slots__ = ("group", "name", "indices")
+
+    def __init__(self, group, name, indices):
         self.group = group
         self.name = name
         self.indices = indices
+
+    @property
+    def parser(self):
+        return self.group.parser
     
     def __getitem__(self, tag_index):
-        tag_data = self.group.search_tag(self.name, *(self.indices + (tag_index,)))
-        if not tag_data:
+        indices = self.indices + (tag_index,)
+        row = self.group._find(self.name, indices)
+        if row is None:
             raise KeyError("{0}: tag not found. identifier should be tag data index".format(tag_index))
         
         # if we're dealling with a meta-tag
-        if tag_data[0] == "MetaTag":
-            return MetaTag(self.parser, self.group, *tag_data[1:])
+        if row == META_TAG:
+            return MetaTag(self.group, self.name, indices)
         # or an actual tag
-        if tag_data[0] == "Tag":
-            return Tag(self.parser, self.group, *tag_data[1:])
+        return Tag(self.group, row)
 
     def __setitem__(self, tag_ident, value):
         raise NotImplementedError("Currently doesn't support write operations", tag_ident, value)
 
     def __contains__(self, tag_index):
-        return not (self.group.search_tag(*(self.indices + (tag_index,))) == None)
+        return self.group._find(self.name, self.indices + (tag_index,)) is not None
 
     def __str__(self):
         return str(self.parser) + self.name
             
 class Group():
-    def __init__(self, parser, index, offset, name):
+    def __init__(self, parser, index, offset, name, tags_offset = None):
         # fill basic data
         self.parser = parser
         self.index = index
         self.offset = offset
         self.name = name
         
-        # read additional data from file
-        self.tags_offset = self.parser.reada_long_long(self.offset + GROUP_NAME_SIZE)
+        # read additional data from file, unless it is already known
+        if tags_offset is None:
+            tags_offset = self.parser.reada_long_long(self.offset + GROUP_NAME_SIZE)
+        self.tags_offset = tags_offset
+
+        # the tag index is built the first time the group is searched
+        self._index = None
+        self._index_lock = threading.Lock()
 
     def __getitem__(self, tag_ident, *tag_indices):
-        debug("searching Tag: {0}{1}".format(tag_ident, tag_indices))
-        tag_data = self.search_tag(tag_ident, *tag_indices)
-        if not tag_data:
+        debug("searching Tag: {0}{1}", tag_ident, tag_indices)
+        row = self._find(tag_ident, tag_indices)
+        if row is None:
             raise AttributeError("{0}: tag {1} not found. identifier should be tag name".format(self.name, tag_ident))
 
         # if we're dealling with a meta-tag
-        if tag_data[0] == "MetaTag":
-            return MetaTag(self.parser, self, *tag_data[1:])
+        if row == META_TAG:
+            return MetaTag(self, tag_ident, tag_indices)
         # or an actual tag
-        if tag_data[0] == "Tag":
-            return Tag(self.parser, self, *tag_data[1:])
+        return Tag(self, row)
 
     def __contains__(self, tag_ident):
-        return (self.search_tag(tag_ident) is not None)
+        return (self._find(tag_ident, ()) is not None)
     
     def __setitem__(self, tag_ident, value):
         raise NotImplementedError("Currently doesn't support write operations", tag_ident, value)
 
+    def tags(self):
+        "iterates over all tags in the group, in file order"
+        return (Tag(self, row) for row in range(0, len(self._get_index())))
+
     ##
     ## actual parsing methods
     ##
     def search_tag(self, tag, *indices):
-        # seek to the tag offset within the group structure
-        self.parser.seek(self.tags_offset)
+        """Looks a tag up by name and indices, using the group's tag index.
+        returns ("Tag", <TagInfo fields>) for a full indices match, ("MetaTag", name, indices) for a partial one, or None"""
+        row = self._find(tag, indices)
+        if row is None:
+            return None
+        # if indices match up to a point, we're deallnig with a meta-tag, so we havn't found an actual tag yet, but we're on our way
+        if row == META_TAG:
+            return ("MetaTag", tag, indices)
+        return ("Tag",) + self._index.info(row)
+
+    def _find(self, tag, indices):
+        "returns the tag's row in the group's TagTable, META_TAG for a meta-tag, or None"
+        stats = self.parser.stats
+        if stats is None:
+            return self._get_index().find(tag, indices)
+
+        start = _clock()
+        if self._index is None:
+            stats.index_misses += 1
+        else:
+            stats.index_hits += 1
+        row = self._get_index().find(tag, indices)
+        stats.add_time("tag_lookup", _clock() - start)
+        return row
+
+    def _get_index(self):
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self._build_index()
+        return self._index
+
+    def _build_index(self):
+        "Collects every tag descriptor into a TagTable, either from the parser's on-disk index cache or by walking the group's tag list once."
+        table = TagTable()
+        # the group's descriptors aren't needed once they're in its table, drop them so they aren't kept twice
+        tags = self.parser._cached_tags.pop(self.index, None)
+        if tags is None:
+            self._walk_tags(table)
+        else:
+            for tag_info in tags:
+                table.append(*tag_info)
+        return table.finish()
+
+    def _walk_tags(self, table):
+        "reads the descriptors of all tags in the group into a TagTable"
+        parser = self.parser
+
+        # the walk keeps its own cursor and only uses absolute reads, so it never touches the shared file position
+        pos = self.tags_offset
 
         # read first tag info
-        flags = self.parser.read_byte()
-        name_size = self.parser.read_byte()
+        flags, name_size = _TAG_HEADER.unpack(parser.reada(pos, _TAG_HEADER.size))
+        pos += _TAG_HEADER.size
         while not (flags == 0 and name_size == 0):
-            # using the name size to read the tag's name
-            name = self.parser.read(name_size)
-            
+            # using the name size to read the tag's name, followed by its indices
             tag_indices_depth = (flags>>6)&0x03
-            tag_indices = []
-            for _ in range(0, tag_indices_depth):
-                tag_indices.append(self.parser.read_long())
-            
+            data = parser.reada(pos, name_size + tag_indices_depth * 4)
+            name = _to_str(data[:name_size])
+            tag_indices = _TAG_INDICES[tag_indices_depth].unpack_from(data, name_size)
+            pos += len(data)
+
             data_size = flags&0x3f
             # these are special data sizes that signal a longer data stream...
             if data_size == 62 or data_size == 63:
                 compressed = (data_size == 63)
-                
+
                 ## read real data sizes (memory and on-disk)
-                data_size = self.parser.read_offset()
-                data_mem_size = self.parser.read_offset()
-                
-                ## read unknown word. seems to always be 0x0000, perhaps structure padding?
-                unkwnown = self.parser.read(2)
+                data_size = parser.reada_offset(pos)
+                data_mem_size = parser.reada_offset(pos + parser.offset_size)
+
+                ## skip unknown word. seems to always be 0x0000, perhaps structure padding?
+                pos += 2 * parser.offset_size + 2
             else:
                 data_mem_size = data_size
                 compressed = False
-            
-            # get data offset
-            data_offset = self.parser.tell()
-            
-            ## if its not the tag we were looking for skip the data
-            self.parser.seek(data_size, os.SEEK_CUR)
+
+            # get data offset and skip the data
+            data_offset = pos
+            pos += data_size
+
+            table.append(name, tag_indices, data_offset, data_size, data_mem_size, compressed)
 
             # read data for the next tag
-            flags = self.parser.read_byte()
-            name_size = self.parser.read_byte()
-            
-            # check if current tag is suitable by name
-            if not name == tag:
-                debug("Found Tag: {name}[{indices}] size: {size} mem size: {mem_size} compressed: {compressed}".format(name=name, indices="][".join(map(str, indices)), size=data_size, mem_size=data_mem_size, compressed=compressed))
-                continue
-                
-            # if a complete indices match is found. for more info regarding the "MetaTag" thing, see the MetaTag class description
-            #print tuple(tag_indices), indices
-            if tuple(tag_indices) == indices:
-                debug("Found Tag: {name}[{indices}] size: {size} mem size: {mem_size} compressed: {compressed}".format(name=name, indices="][".join(map(str, indices)), size=data_size, mem_size=data_mem_size, compressed=compressed))
-                return ("Tag", name, tag_indices, data_offset, data_size, data_mem_size, compressed)
-
-            # if indices match up to a point, we're deallnig with a meta-tag, so we havn't found an actual tag yet, but we're on our way
-            if tuple(tag_indices[0:len(indices)]) == indices:
-                debug("Found Meta-Tag: {name}{indices}".format(name=name, indices=tag_indices))
-                return ("MetaTag", name, indices)
-            else:
-                debug("Tag: {name} {indexes} size: {size} mem size: {mem_size} compressed: {compressed}".format(name=name, indexes="".join(indexes), size=data_size, mem_size=data_mem_size, compressed=compressed))
+            flags, name_size = _TAG_HEADER.unpack(parser.reada(pos, _TAG_HEADER.size))
+            pos += _TAG_HEADER.size
+
+        if parser.stats is not None:
+            parser.stats.tags_scanned += len(table)
+        debug("indexed group {name}: {count} tags", name=self.name, count=len(table))
 
     def __str__(self):
         return self.name
@@ -235,33 +923,74 @@ class Parser():
     A tag can either directly contain data or have internal levels of indices, in a wat that resembles arrays. tags that has additional levels of indices, and don't contain data, are called 'MetaTags'.
     
     the vmsn file strucure begins with a simple header that contains a magic and the number of groups in file.
+
+    Thread safety: every read at an absolute address (reada and the reada_* helpers), group and tag lookups, and all Tag read methods
+    never depend on the shared file position, so a single Parser and the Group and Tag objects it returns can be used from a thread pool.
+    the stateful seek, tell, read and read_* helpers do share the file handle's position and are not safe to use concurrently.
+
+    By default the file is memory mapped, so reads at an absolute address decode straight out of the map and Tag.read(copy=False)
+    returns slices without copying. handles that can't be mapped (pipes, in-memory or wrapped files, empty files) or passing use_mmap=False
+    fall back to positional reads (os.pread) on the handle's file descriptor, or to seek and read calls serialized by a lock where
+    pread isn't available.
+
+    Compressed tags are decompressed transparently by Tag.read (see CompressedData), cache_size is the memory budget in bytes for
+    decompressed blocks, shared by all compressed tags in the file.
+
+    stats=True collects read counters and phase timings into a ParserStats object, available as the stats attribute (None otherwise).
+    debug output goes to the "vmsn" logger, and is only formatted when debug logging is enabled for it.
+
+    index_cache optionally takes an IndexCache, which stores the group table, all tag descriptors and the memory regions on disk,
+    so reopening the same (unchanged) file doesn't need to walk it again.
+
+    For files on network storage, block_size (in bytes) reads the file through a BlockCache of that block size instead of mapping it,
+    with a budget of block_cache_size bytes and readahead bytes of read-ahead for sequential reads. it is available (with its hit
+    and miss counters) as the block_cache attribute, which is None otherwise.
     """
     
     _header_size = 12
     _group_size = 80
     _group_name_size = 64
     
-    def __init__(self, fh):
+    def __init__(self, fh, use_mmap = True, cache_size = DEFAULT_CACHE_SIZE, index_cache = None, stats = False,
+                 block_size = 0, block_cache_size = DEFAULT_BLOCK_CACHE_SIZE, readahead = DEFAULT_READAHEAD):
         if not "b" in fh.mode.lower():
             raise ValueError("Invalid file handler: file must be opened in binary mode (and not {0})".format(fh.mode))
         
         self.fh = fh
+        self.stats = ParserStats() if stats else None
+        if stats:
+            start = _clock()
+
+        ## decompressed data of compressed tags, and the block cache shared by all of them
+        self._cache = _LRUCache(cache_size)
+        self._compressed = {}
+
+        ## map the file if possible, otherwise all reads go through the file handle (and the block cache, if there is one)
+        self.block_cache = BlockCache(self._reada_file, block_size, block_cache_size, readahead) if block_size else None
+        self._map = self._map_file(fh) if use_mmap and not block_size else None
+        self._view = None
+        self._fd = None
+        self._lock = threading.Lock()
+        if self._map is None and _pread is not None:
+            try:
+                self._fd = fh.fileno()
+            except (AttributeError, EnvironmentError, ValueError):
+                pass
+        if self._map is not None:
+            try:
+                self._view = memoryview(self._map)
+            except TypeError:
+                # python 2's mmap doesn't support the new buffer interface
+                pass
         
         ## Must start with one of the magic values
         magic = self.reada_long(0)
-        debug("{0:x}".format(magic))
+        debug("{0:x}", magic)
         
         ## Resolve version and magic
-        if magic == 0xbed2bed0:
-            self.version = 0
-        elif magic == 0xbad1bad1:
-            self.version = 1
-        elif magic == 0xbed2bed2:
-            self.version = 2
-        elif magic == 0xbed3bed3:
-            self.version = 3
-        else:
+        if magic not in MAGICS:
             raise ParserException("Header signature invalid", magic)
+        self.version = MAGICS[magic]
 
         ## determine offset sizes.
         # this is used whenever the vmsn specifications use 4\8 byte ints dependant of version, so "offset" is a bit misleading.
@@ -269,16 +998,49 @@ class Parser():
             
         ## Read group count
         self.group_count = self.reada_long(8)
+
+        ## read the whole group directory at once
+        self._group_table = self._read_group_table()
+        self._group_names = {}
+        for group_index, (group_name, _) in enumerate(self._group_table):
+            self._group_names.setdefault(group_name, group_index)
+        # Group objects are created on first access and shared by all later lookups
+        self._groups = [None] * self.group_count
+
+        ## structures loaded from the on-disk index cache, if one is used
+        # tag descriptors by group index and the memory runs
+        self._cached_tags = {}
+        self._cached_runs = None
+        if index_cache is not None:
+            self._load_index(index_cache)
+
+        if stats:
+            self.stats.add_time("open", _clock() - start)
         
     def __getitem__(self, group_ident):
+        if self.stats is not None:
+            start = _clock()
         group_data = self.search_group(group_ident)
         if not group_data:
             raise KeyError("{0}: group not found. identifier could be either group index or name".format(group_ident))
-            
-        return Group(self, *group_data)
+
+        group = self._group(group_data[0])
+        if self.stats is not None:
+            self.stats.add_time("group_lookup", _clock() - start)
+        return group
 
     def __contains__(self, group_ident):
-        return (self.search_group(group_ident) == None)
+        return (self.search_group(group_ident) is not None)
+
+    def __len__(self):
+        return self.group_count
+
+    def __iter__(self):
+        return iter(self.groups())
+
+    def groups(self):
+        "returns all groups, in file order"
+        return [self._group(group_index) for group_index in range(0, self.group_count)]
     
     def __setitem__(self, group_ident):
         raise NotImplementedError("Currently doesn't support write operations,1")
@@ -287,47 +1049,199 @@ class Parser():
     ## actual parsing methods
     ##
     def search_group(self, group):
-        for group_index in xrange(0, self.group_count):
-            ## seek to begining of the group
-            self.seek(HEADER_SIZE + group_index * GROUP_SIZE)
-        
-            group_name = ""
-            while True:
-                ch = self.read(1)
-                if ch == '\x00':
-                    break
-                    
-                group_name += ch
-            
-            # support getting the group by both index and name
-            if group_name == group or group_index == group:
-                debug("found group {i}: {name}".format(name=group_name, i=group_index))
-                return group_index, (HEADER_SIZE + group_index * GROUP_SIZE), group_name
+        # support getting the group by both index and name
+        group_index = self._group_names.get(group)
+        if group_index is None and isinstance(group, int) and 0 <= group < self.group_count:
+            group_index = group
+        if group_index is None:
+            return None
+
+        group_name = self._group_table[group_index][0]
+        debug("found group {i}: {name}", name=group_name, i=group_index)
+        return group_index, (HEADER_SIZE + group_index * GROUP_SIZE), group_name
+
+    def _group(self, group_index):
+        group = self._groups[group_index]
+        if group is None:
+            with self._lock:
+                group = self._groups[group_index]
+                if group is None:
+                    group_name, tags_offset = self._group_table[group_index]
+                    group = Group(self, group_index, HEADER_SIZE + group_index * GROUP_SIZE, group_name, tags_offset)
+                    self._groups[group_index] = group
+        return group
+
+    def _read_group_table(self):
+        "reads and decodes the whole group directory, returning a (name, tags offset) tuple for every group"
+        size = self.group_count * GROUP_SIZE
+        data = self.reada(HEADER_SIZE, size)
+        if len(data) < size:
+            raise ParserException("Group directory is truncated", self.group_count)
+
+        table = []
+        for group_offset in range(0, size, GROUP_SIZE):
+            ## the group's name is NUL terminated, and followed by the offset of the group's tags
+            group_name = _to_str(data[group_offset:group_offset + GROUP_NAME_SIZE].split(b"\x00", 1)[0])
+            (tags_offset,) = _LONG_LONG.unpack_from(data, group_offset + GROUP_NAME_SIZE)
+            table.append((group_name, tags_offset))
+        return table
     
+    def _load_index(self, index_cache):
+        "loads the file's structure from the index cache, or indexes the whole file and saves it there"
+        data = index_cache.load(self)
+        if self.stats is not None:
+            if data is None:
+                self.stats.index_cache_misses += 1
+            else:
+                self.stats.index_cache_hits += 1
+        if data is None:
+            data = self._collect_index()
+            if data is None:
+                # the file couldn't be indexed as a whole, its groups are walked (and fail) on access, as without a cache
+                return
+            index_cache.save(self, data)
+            # collecting built every group's tag table, only the runs are still needed
+            self._cached_runs = [tuple(run) for run in data["runs"]] if data["runs"] is not None else None
+            return
+
+        # names are saved as latin-1 text, see _collect_index. the group table itself is always read from the file
+        self._cached_tags = dict((group_index, [TagInfo(_to_str(tag[0].encode("latin-1")), tuple(tag[1]), *tag[2:]) for tag in tags])
+                                 for group_index, tags in data["tags"])
+        self._cached_runs = [tuple(run) for run in data["runs"]] if data["runs"] is not None else None
+
+    def _collect_index(self):
+        """walks all groups, tags and memory regions, returning them in the form saved by IndexCache,
+        or None if any group's tag list is malformed or truncated"""
+        # python 2 names are byte strings, json needs them as text
+        text = lambda name: name.decode("latin-1") if isinstance(name, bytes) else name
+
+        groups = []
+        tags = []
+        try:
+            for group in self.groups():
+                groups.append((text(group.name), group.tags_offset))
+                tags.append((group.index, [(text(tag_info.name),) + tuple(tag_info[1:]) for tag_info in group._get_index().infos()]))
+        except (struct.error, ParserException) as e:
+            debug("not caching the index of a malformed file: {0}", e)
+            return None
+
+        try:
+            runs = PhysicalMemory(self).runs
+        except (KeyError, AttributeError, ParserException):
+            runs = None
+
+        return {"groups": groups, "tags": tags, "runs": runs}
+
+    def compressed_data(self, tag):
+        "returns the (shared) CompressedData object used to read a compressed tag"
+        with self._lock:
+            data = self._compressed.get(tag.data_offset)
+            if data is None:
+                data = CompressedData(self, tag.data_offset, tag.data_size, tag.data_mem_size)
+                self._compressed[tag.data_offset] = data
+        return data
+
+    @staticmethod
+    def _map_file(fh):
+        "maps the whole file read only, or returns None if the handle can't be mapped"
+        try:
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError, OverflowError):
+            return None
+
     ##
     ## These are utilities to ease the access for the lower level file
     ## read predefined sizes in predefined formats without duplicating code..
     ## its still a bit ugly but i couldn't think of a simple yet better way to implement this
     ##
     def seek(self, addr, curr = os.SEEK_SET):
+        if self.stats is not None:
+            self.stats.seeks += 1
+            self.stats.syscalls += 1
         return self.fh.seek(addr, curr)
     
     def tell(self):
         return self.fh.tell()
 
     def read(self, size):
-        return self.fh.read(size)
+        if self.block_cache is not None:
+            pos = self.fh.tell()
+            data = self.block_cache.read(pos, size)
+            self.fh.seek(pos + len(data))
+            return data
+        return self._read_file(size)
+
+    def _read_file(self, size):
+        data = self.fh.read(size)
+        if self.stats is not None:
+            self.stats.reads += 1
+            self.stats.syscalls += 1
+            self.stats.bytes_read += len(data)
+        return data
         
     def reada(self, addr, size):
         """Reads from a specific address without changing the current file position
-        Note: actually does change the current file position but restores it after reading. should use cation since not atomic"""
-        curr = self.tell()
-        
-        self.seek(addr)
-        data = self.read(size)
-        
-        self.seek(curr)
+        reads either slice the memory map, go through the block cache or use pread, falling back to seeking and restoring the file
+        position under a lock"""
+        if self._map is not None:
+            data = self._map[addr:addr+size]
+            if self.stats is not None:
+                self.stats.reads += 1
+                self.stats.bytes_read += len(data)
+            return data
+
+        if self.block_cache is not None:
+            return self.block_cache.read(addr, size)
+        return self._reada_file(addr, size)
+
+    def _reada_file(self, addr, size):
+        "reads from a specific address of the file itself"
+        if self._fd is not None:
+            data = _pread(self._fd, size, addr)
+            syscalls = 1
+            # pread may return less than asked for (i.e. huge reads), keep reading until EOF
+            while len(data) < size:
+                chunk = _pread(self._fd, size - len(data), addr + len(data))
+                syscalls += 1
+                if not chunk:
+                    break
+                data += chunk
+            if self.stats is not None:
+                self.stats.reads += 1
+                self.stats.syscalls += syscalls
+                self.stats.bytes_read += len(data)
+            return data
+
+        # the stateful helpers below count the seeks and the read
+        with self._lock:
+            curr = self.tell()
+            
+            self.seek(addr)
+            data = self._read_file(size)
+            
+            self.seek(curr)
         return data
+
+    def view(self, addr, size):
+        "same as reada, but returns a memoryview. the view references the memory map directly (without copying) when possible"
+        if self._view is not None:
+            view = self._view[addr:addr+size]
+            if self.stats is not None:
+                self.stats.reads += 1
+                self.stats.bytes_read += len(view)
+            return view
+        return memoryview(self.reada(addr, size))
+
+    def _unpacka(self, fmt, addr):
+        "decodes a single int at a specific address, directly from the memory map when possible"
+        if self._map is not None:
+            (val,) = fmt.unpack_from(self._map, addr)
+            if self.stats is not None:
+                self.stats.reads += 1
+                self.stats.bytes_read += fmt.size
+        else:
+            (val,) = fmt.unpack(self.reada(addr, fmt.size))
+        return val
     
     def read_offset(self):
         "a few offsets` sizes are dependant of version, so this abstraction helps us read the right amount"
@@ -359,31 +1273,648 @@ class Parser():
     # reada functions - read data in a specific address
     def reada_offset(self, addr):
         "a few offsets` sizes are dependant of version, so this abstraction helps us read the right amount"
-        string = self.reada(addr, self.offset_size)
-        if self.offset_size == 4:
-            (longval,) = struct.unpack('=I', string)
-        elif self.offset_size == 8:
-            (longval,) = struct.unpack('=Q', string)
-        return longval
+        return self._unpacka(_LONG if self.offset_size == 4 else _LONG_LONG, addr)
 
     def reada_long_long(self, addr):
         "this is used to read qword ints invariant of version"
-        string = self.reada(addr, 8)
-        (longval,) = struct.unpack('=Q', string)
-        return longval
+        return self._unpacka(_LONG_LONG, addr)
 
     def reada_long(self, addr):
         "this is used to read dword ints invariant of version"
-        string = self.reada(addr, 4)
-        (val,) = struct.unpack('=I', string)
-        return val
+        return self._unpacka(_LONG, addr)
     
     def reada_byte(self, addr):
         "this is used to read qword ints invariant of version"
-        string = self.reada(addr, 1)
-        (val,) = struct.unpack('=B', string)
-        return val
+        return self._unpacka(_BYTE, addr)
 
     def close(self):
         "just in case i'd need to close something"
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # views handed out by Tag.read(copy=False) are still alive, the map will be freed along with them
+                pass
+            self._map = None
         self.fh.close()
+
+class IndexCache():
+    """On-disk cache of a file's structure: the group table, every tag descriptor and the memory region runs.
+
+    Entries are written to a user cache directory (by default $XDG_CACHE_HOME/vmsn, ~/.cache/vmsn or %LOCALAPPDATA%\\vmsn), named
+    after the snapshot's absolute path, or next to the snapshot itself (<snapshot>.vmsnidx) when sidecar is True.
+    an entry is keyed by the snapshot's path, size and modification time and a hash of the file's header and group directory,
+    so it is only used when all of these still match. otherwise (or when the entry can't be read) the file is indexed again and the
+    entry is replaced. entries are zlib compressed json, written to a temporary file and renamed into place."""
+    _magic = b"VMSNIDX1"
+    _sidecar_extension = ".vmsnidx"
+
+    def __init__(self, directory = None, sidecar = False):
+        self.sidecar = sidecar
+        self.directory = directory if directory is not None else self.default_directory()
+
+    @staticmethod
+    def default_directory():
+        base = os.environ.get("XDG_CACHE_HOME")
+        if not base and os.name == "nt":
+            base = os.environ.get("LOCALAPPDATA")
+        if not base:
+            base = os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(base, "vmsn")
+
+    def entry_path(self, path):
+        path = os.path.abspath(path)
+        if self.sidecar:
+            return path + self._sidecar_extension
+        return os.path.join(self.directory, hashlib.sha1(path.encode("utf-8")).hexdigest() + self._sidecar_extension)
+
+    def key(self, parser):
+        "returns the key identifying the parser's file, or None if it has no path on disk"
+        try:
+            path = os.path.abspath(parser.fh.name)
+            stat = os.fstat(parser.fh.fileno())
+        except (AttributeError, TypeError, EnvironmentError, ValueError):
+            return None
+
+        header = parser.reada(0, HEADER_SIZE + parser.group_count * GROUP_SIZE)
+        return {"path": path, "size": stat.st_size, "mtime": getattr(stat, "st_mtime_ns", stat.st_mtime),
+                "header": hashlib.sha1(header).hexdigest()}
+
+    def load(self, parser):
+        "returns the cached structure of the parser's file, or None if there's no valid entry"
+        key = self.key(parser)
+        if key is None:
+            return None
+
+        try:
+            with open(self.entry_path(key["path"]), "rb") as fh:
+                data = fh.read()
+            if not data.startswith(self._magic):
+                return None
+            entry = json.loads(zlib.decompress(data[len(self._magic):]).decode("utf-8"))
+        except (EnvironmentError, ValueError, zlib.error):
+            return None
+
+        if entry.get("key") != key:
+            debug("index cache entry for {0} is stale", key["path"])
+            return None
+        return entry
+
+    def save(self, parser, data):
+        "writes an entry for the parser's file. failing to write the cache is never fatal"
+        key = self.key(parser)
+        if key is None:
+            return
+
+        entry = dict(data, key=key)
+        path = self.entry_path(key["path"])
+        tmp_path = "{0}.{1}.tmp".format(path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(tmp_path, "wb") as fh:
+                fh.write(self._magic + zlib.compress(json.dumps(entry, separators=(",", ":")).encode("utf-8")))
+            if os.name == "nt" and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        except (EnvironmentError, ValueError) as e:
+            debug("failed writing index cache entry {0}: {1}", path, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def _coalesce(pieces):
+    """merges pieces, (offset, length, ...) tuples sorted by offset, into reads. yields (start, end, pieces) for every read:
+    following pieces are merged while they are at most COALESCE_GAP apart and the read stays within COALESCE_MAX bytes"""
+    i = 0
+    while i < len(pieces):
+        start = pieces[i][0]
+        end = start + pieces[i][1]
+        j = i + 1
+        while j < len(pieces) and pieces[j][0] <= end + COALESCE_GAP and max(end, pieces[j][0] + pieces[j][1]) - start <= COALESCE_MAX:
+            end = max(end, pieces[j][0] + pieces[j][1])
+            j += 1
+        yield start, end, pieces[i:j]
+        i = j
+
+class PhysicalMemory():
+    """Translates guest physical addresses into offsets within the memory group's "Memory" tag, and reads guest memory.
+
+    The guest's memory is saved as regions, each described by the regionPPN (the guest's physical page number),
+    regionPageNum (page number within the Memory tag) and regionSize (in pages) tags of the memory group.
+    files with no "regionsCount" tag keep all memory as a single region starting at physical address zero.
+    runs are kept as (physical address, tag offset, length) tuples sorted by physical address, and addresses are resolved with a
+    binary search over the run starts.
+
+    Offsets are relative to the Memory tag, so reads work for compressed memory tags as well. file_runs returns the runs
+    with absolute file offsets for users (like the Volatility address space) that read the file directly."""
+    def __init__(self, parser):
+        self.parser = parser
+        memory = parser["memory"]
+        self.tag = memory["Memory"][0][0]
+
+        runs = []
+        region_count = 0
+        if parser._cached_runs is not None:
+            runs.extend(parser._cached_runs)
+        elif "regionsCount" in memory:
+            region_count = memory["regionsCount"].read_long()
+
+        if region_count > 0:
+            for region_i in range(0, region_count):
+                try:
+                    memory_offset = memory["regionPPN"][region_i].read_long() * PAGE_SIZE
+                    tag_offset = memory["regionPageNum"][region_i].read_long() * PAGE_SIZE
+                    length = memory["regionSize"][region_i].read_long() * PAGE_SIZE
+                except (KeyError, AttributeError):
+                    raise ParserException("File is corrupt. Internal data memory region #{0} is missing.".format(region_i))
+                runs.append((memory_offset, tag_offset, length))
+        elif not runs:
+            # a single region, covering the entire memory tag
+            runs.append((0, 0, self.tag.size))
+
+        runs.sort()
+        self.runs = runs
+        self._starts = [run[0] for run in runs]
+
+    def file_runs(self):
+        "returns the runs as (physical address, file offset, length) tuples. only possible when the memory tag isn't compressed"
+        if self.tag.compressed:
+            raise ParserException("Memory tag is compressed, physical addresses don't map to file offsets")
+        return [(memory_offset, self.tag.data_offset + tag_offset, length) for memory_offset, tag_offset, length in self.runs]
+
+    def ranges(self):
+        "yields (physical address, length) for every mapped range"
+        for memory_offset, _, length in self.runs:
+            yield memory_offset, length
+
+    def translate(self, paddr):
+        "returns the memory tag offset of a physical address, or None if the address isn't mapped"
+        i = bisect_right(self._starts, paddr) - 1
+        if i < 0:
+            return None
+        memory_offset, tag_offset, length = self.runs[i]
+        if paddr >= memory_offset + length:
+            return None
+        return tag_offset + paddr - memory_offset
+
+    def is_valid_address(self, paddr):
+        return self.translate(paddr) is not None
+
+    def segments(self, paddr, size):
+        """yields the (physical address, tag offset, length) pieces of a physical range, in address order.
+        the tag offset is None for unmapped pieces"""
+        end = paddr + size
+        i = bisect_right(self._starts, paddr) - 1
+        while paddr < end:
+            if i >= 0:
+                memory_offset, tag_offset, length = self.runs[i]
+                if paddr < memory_offset + length:
+                    n = min(end, memory_offset + length) - paddr
+                    yield paddr, tag_offset + paddr - memory_offset, n
+                    paddr += n
+                    continue
+
+            # in a gap, up to the next run
+            next_start = self._starts[i + 1] if i + 1 < len(self.runs) else end
+            n = min(end, next_start) - paddr
+            if n > 0:
+                yield paddr, None, n
+                paddr += n
+            i += 1
+
+    def read(self, paddr, size):
+        "reads guest physical memory. returns None if any part of the range isn't mapped"
+        segments = list(self.segments(paddr, size))
+        if any(tag_offset is None for _, tag_offset, _ in segments):
+            return None
+        return self.read_many([(paddr, size)])[0]
+
+    def zread(self, paddr, size):
+        "reads guest physical memory, unmapped parts are filled with zeros"
+        return self.read_many([(paddr, size)])[0]
+
+    def read_many(self, requests):
+        """Reads several (physical address, size) ranges, returning their data in the same order. unmapped parts are filled with zeros.
+        the pieces of all requests are sorted by their offset in the file and adjacent (or nearly adjacent) ones are merged,
+        so many small reads cost as few file reads as possible."""
+        results = [bytearray(size) for _, size in requests]
+
+        # (tag offset, length, request number, offset within the request's result)
+        pieces = []
+        for request_i, (paddr, size) in enumerate(requests):
+            for piece_paddr, tag_offset, length in self.segments(paddr, size):
+                if tag_offset is not None:
+                    pieces.append((tag_offset, length, request_i, piece_paddr - paddr))
+        pieces.sort()
+
+        for start, end, merged in _coalesce(pieces):
+            data = self.tag.read(start, end - start)
+            for tag_offset, length, request_i, result_offset in merged:
+                results[request_i][result_offset:result_offset + length] = data[tag_offset - start:tag_offset - start + length]
+
+        return [bytes(result) for result in results]
+
+def _read_register(tag):
+    "reads a cpu register tag, which may be saved as 4 or 8 bytes"
+    return tag.read_long_long() if tag.size >= 8 else tag.read_long()
+
+def _vcpu_register(cpu, name, vcpu, *indices):
+    """reads the cpu group's name[vcpu][indices...] register, or returns None if there's no such tag.
+    a register saved without any indices (once, not per vcpu) is used for every vcpu"""
+    try:
+        tag = cpu[name]
+        if isinstance(tag, Tag) and not indices:
+            return _read_register(tag)
+        for index in (vcpu,) + indices:
+            if not isinstance(tag, MetaTag):
+                raise ParserException("Register tag {0} has fewer indices than expected ({1})".format(name, 1 + len(indices)))
+            tag = tag[index]
+    except (KeyError, AttributeError):
+        return None
+    if not isinstance(tag, Tag):
+        raise ParserException("Register tag {0} has more indices than expected ({1})".format(name, 1 + len(indices)))
+    return _read_register(tag)
+
+class VirtualMemory():
+    """Translates guest virtual addresses by walking the guest's page tables in physical memory, and reads guest virtual memory.
+
+    Supports x86-64 4 level paging (mode "x64", with 1 GiB and 2 MiB pages) and 32 bit PAE paging (mode "pae", with 2 MiB pages).
+    memory is a PhysicalMemory (or a Parser to build one from). dtb is the physical address of the top level table (CR3), taken
+    from the given vcpu's CR3 by default, so any vcpu's address space can be used. the mode is detected from the vcpu's EFER.LMA
+    (and CR4.PAE) when the snapshot has an EFER tag, and is "x64" otherwise.
+
+    Translations are cached per page in an LRU TLB of tlb_entries pages, and page-table pages in an LRU cache of page_table_cache
+    bytes. translate_many and read walk their addresses in order and share the entries of upper-level tables between walks,
+    so pages under the same tables cost a single table read. nothing is ever invalidated, a snapshot's memory doesn't change."""
+    def __init__(self, memory, dtb = None, vcpu = 0, mode = None, tlb_entries = DEFAULT_TLB_ENTRIES, page_table_cache = DEFAULT_PAGE_TABLE_CACHE):
+        if isinstance(memory, Parser):
+            memory = PhysicalMemory(memory)
+        self.memory = memory
+        cpu = memory.parser["cpu"] if (dtb is None or mode is None) else None
+
+        if mode is None:
+            mode = "x64"
+            efer = _vcpu_register(cpu, "EFER", vcpu)
+            if efer is not None and not efer & _EFER_LMA:
+                if not (_vcpu_register(cpu, "CR", vcpu, 4) or 0) & _CR4_PAE:
+                    raise ParserException("vcpu {0} doesn't use PAE or 4 level paging, which are the supported paging modes".format(vcpu))
+                mode = "pae"
+        if mode not in PAGING_LEVELS:
+            raise ValueError("Unknown paging mode {0}, should be one of {1}".format(mode, ", ".join(sorted(PAGING_LEVELS))))
+        self.mode = mode
+        self._levels = PAGING_LEVELS[mode]
+
+        if dtb is None:
+            dtb = _vcpu_register(cpu, "CR", vcpu, 3)
+            if dtb is None:
+                raise ParserException("vcpu {0} has no CR3, the page tables can't be found".format(vcpu))
+        # a PAE page directory pointer table is 32 byte aligned
+        self.dtb = dtb & (0xffffffe0 if mode == "pae" else _PTE_ADDRESS)
+
+        self._tlb = _LRUCache(tlb_entries, sizeof=lambda value: 1)
+        self._tables = _LRUCache(page_table_cache)
+        self.tlb_hits = 0
+        self.tlb_misses = 0
+
+    def _valid(self, vaddr):
+        "whether vaddr is canonical (x64) or 32 bit (PAE)"
+        if self.mode == "pae":
+            return 0 <= vaddr < (1 << 32)
+        return 0 <= vaddr < (1 << 47) or (1 << 64) - (1 << 47) <= vaddr < (1 << 64)
+
+    def _entry(self, addr):
+        "reads the page-table entry at a physical address, or None if it isn't in physical memory"
+        page = addr & ~(PAGE_SIZE - 1)
+        data = self._tables.get(page)
+        if data is None:
+            data = self.memory.read(page, PAGE_SIZE)
+            if data is None:
+                return None
+            self._tables.put(page, data)
+        (entry,) = _LONG_LONG.unpack_from(data, addr - page)
+        return entry
+
+    def _walk(self, vaddr, shared = None):
+        """walks the page tables, returning the physical address of vaddr's (4 KiB) page or None if it isn't mapped.
+        shared, if given, holds the entries already read by other walks, keyed by level and the virtual address bits above it"""
+        table = self.dtb
+        for level, (shift, bits, large) in enumerate(self._levels):
+            key = (level, vaddr >> shift)
+            entry = shared.get(key) if shared is not None else None
+            if entry is None:
+                entry = self._entry(table + ((vaddr >> shift) & ((1 << bits) - 1)) * 8)
+                if entry is None:
+                    return None
+                if shared is not None:
+                    shared[key] = entry
+            if not entry & _PTE_PRESENT:
+                return None
+            if large and entry & _PTE_LARGE:
+                size = 1 << shift
+                return (entry & _PTE_ADDRESS & ~(size - 1)) + (vaddr & (size - 1) & ~(PAGE_SIZE - 1))
+            table = entry & _PTE_ADDRESS
+        return table
+
+    def _page(self, vaddr, shared = None):
+        "the physical address of vaddr's page, through the TLB"
+        vpage = vaddr >> 12
+        ppage = self._tlb.get(vpage)
+        if ppage is not None:
+            self.tlb_hits += 1
+            return ppage
+        self.tlb_misses += 1
+        if not self._valid(vaddr):
+            return None
+        ppage = self._walk(vaddr, shared)
+        if ppage is not None:
+            self._tlb.put(vpage, ppage)
+        return ppage
+
+    def translate(self, vaddr):
+        "returns the physical address of a virtual address, or None if it isn't mapped"
+        ppage = self._page(vaddr)
+        if ppage is None:
+            return None
+        return ppage | (vaddr & (PAGE_SIZE - 1))
+
+    def translate_many(self, vaddrs):
+        """translates a list of virtual addresses, returning their physical addresses (or None) in the same order.
+        addresses are walked in sorted order, sharing the entries of upper-level tables between walks"""
+        results = [None] * len(vaddrs)
+        shared = {}
+        for i in sorted(range(0, len(vaddrs)), key=vaddrs.__getitem__):
+            ppage = self._page(vaddrs[i], shared)
+            if ppage is not None:
+                results[i] = ppage | (vaddrs[i] & (PAGE_SIZE - 1))
+        return results
+
+    def is_valid_address(self, vaddr):
+        return self.translate(vaddr) is not None
+
+    def _pieces(self, vaddr, size):
+        "splits a virtual range into [physical address, length] pieces, merging physically contiguous pages. unmapped pieces have None"
+        end = vaddr + size
+        starts = list(range(vaddr & ~(PAGE_SIZE - 1), end, PAGE_SIZE))
+        pieces = []
+        for page_vaddr, ppage in zip(starts, self.translate_many(starts)):
+            start = max(vaddr, page_vaddr)
+            length = min(end, page_vaddr + PAGE_SIZE) - start
+            paddr = ppage + start - page_vaddr if ppage is not None else None
+            if pieces and pieces[-1][0] is None and paddr is None:
+                pieces[-1][1] += length
+            elif pieces and None not in (pieces[-1][0], paddr) and pieces[-1][0] + pieces[-1][1] == paddr:
+                pieces[-1][1] += length
+            else:
+                pieces.append([paddr, length])
+        return pieces
+
+    def _read(self, pieces):
+        data = iter(self.memory.read_many([(paddr, length) for paddr, length in pieces if paddr is not None]))
+        return b"".join(next(data) if paddr is not None else b"\x00" * length for paddr, length in pieces)
+
+    def read(self, vaddr, size):
+        "reads guest virtual memory. returns None if any part of the range isn't mapped (in the page tables or in physical memory)"
+        pieces = self._pieces(vaddr, size)
+        for paddr, length in pieces:
+            if paddr is None or any(tag_offset is None for _, tag_offset, _ in self.memory.segments(paddr, length)):
+                return None
+        return self._read(pieces)
+
+    def zread(self, vaddr, size):
+        "reads guest virtual memory, unmapped parts are filled with zeros"
+        return self._read(self._pieces(vaddr, size))
+
+class Registers(object):
+    """The values of a single register tag of the cpu group for all vcpus, in a fixed layout.
+
+    the first index of a register's tags is the vcpu, shape is the size of every index after it (() for one value per vcpu,
+    (16,) for a tag such as gpregs[vcpu][0..15]) and width the number of values per vcpu. values are kept flat, vcpu v's
+    values start at v * width. values is an array of ints when every tag is 1, 2, 4 or 8 bytes long, and a list of byte
+    strings otherwise. present marks the values that have a tag, the others are 0 (or None).
+    tags with no indices (not per vcpu) are kept as a single vcpu, with per_vcpu False."""
+    __slots__ = ("name", "vcpu_count", "shape", "width", "per_vcpu", "values", "present")
+
+    def __init__(self, name, vcpu_count, shape, per_vcpu, integer):
+        self.name = name
+        self.vcpu_count = vcpu_count
+        self.shape = shape
+        self.width = 1
+        for size in shape:
+            self.width *= size
+        self.per_vcpu = per_vcpu
+        count = vcpu_count * self.width
+        if count > MAX_REGISTER_ENTRIES:
+            raise ParserException("Register tag {0} has {1} entries, too many for a fixed layout".format(name, count))
+        if not integer:
+            self.values = [None] * count
+        elif _QWORD is not None:
+            self.values = array(_QWORD, [0]) * count
+        else:
+            self.values = [0] * count
+        self.present = bytearray(count)
+
+    def _position(self, vcpu, indices):
+        "the flat position of a value, or None if it is out of the layout"
+        if len(indices) != len(self.shape) or not 0 <= vcpu < self.vcpu_count:
+            return None
+        position = vcpu
+        for index, size in zip(indices, self.shape):
+            if not 0 <= index < size:
+                return None
+            position = position * size + index
+        return position
+
+    def get(self, vcpu, *indices):
+        "returns a single value, or None if there's no such tag"
+        position = self._position(vcpu, indices)
+        if position is None or not self.present[position]:
+            return None
+        return self.values[position]
+
+    def __getitem__(self, vcpu):
+        "returns a vcpu's value, or its values as (nested) lists for registers with more indices"
+        if not 0 <= vcpu < self.vcpu_count:
+            raise IndexError("{0}: no vcpu {1}".format(self.name, vcpu))
+        return self._nest(vcpu * self.width, self.shape)
+
+    def _nest(self, position, shape):
+        if not shape:
+            return self.values[position] if self.present[position] else None
+        step = 1
+        for size in shape[1:]:
+            step *= size
+        return [self._nest(position + i * step, shape[1:]) for i in range(0, shape[0])]
+
+    def as_list(self):
+        "every vcpu's values, or the single value of registers that aren't per vcpu"
+        if not self.per_vcpu:
+            return self[0]
+        return [self[vcpu] for vcpu in range(0, self.vcpu_count)]
+
+def _jsonable(value):
+    # byte strings (register tags that aren't ints) are exported as hex
+    if isinstance(value, list):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return binascii.hexlify(value).decode("ascii")
+    return value
+
+class CpuState():
+    """The registers of all vcpus, decoded out of the cpu group.
+
+    opening it makes a single pass over the group's tag table, sorting tag rows by register name without reading any data.
+    registers are decoded per family (see REGISTER_FAMILIES) the first time any register of the family is used: the family's
+    tags are read with as few file reads as possible (see PhysicalMemory.read_many) into Registers, fixed layout arrays indexed
+    by vcpu. a register's tags all have the depth of its first tag, tags of other depths are ignored.
+
+    every register has its own vcpu count (the largest first index of its tags), so a tag whose first index isn't a vcpu
+    doesn't affect any other register. vcpu_count is the count of the first of VCPU_REGISTERS found in the file (or 0).
+    a register whose indices are too large for a fixed layout raises its ParserException when it is used by name, and is
+    left out of family, vcpu and as_dict, so it doesn't break the rest of its family.
+
+    usage:
+        cpu = CpuState(parser)
+        cr3 = cpu["CR"][0][3]           # or cpu["CR"].get(0, 3)
+        state = cpu.vcpu(0)             # {register name: value(s)}
+        text = cpu.to_json()"""
+    def __init__(self, parser, group = "cpu"):
+        self.parser = parser
+        self.group = parser[group]
+        table = self.group._get_index()
+
+        ## sort rows by register, and find the number of vcpus
+        self._rows = {}
+        vcpu_counts = {}
+        depths = table.depths
+        index_column = table.index_column
+        for row in range(0, len(table)):
+            name = table.name(row)
+            self._rows.setdefault(name, []).append(row)
+            if depths[row]:
+                vcpu_counts[name] = max(vcpu_counts.get(name, 0), index_column[row * MAX_TAG_DEPTH] + 1)
+        self.vcpu_count = next((vcpu_counts[name] for name in VCPU_REGISTERS if name in vcpu_counts), 0)
+
+        self._registers = {}
+        # the errors of registers that couldn't be laid out, by name
+        self._errors = {}
+        self._decoded = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def family_of(name):
+        return _REGISTER_FAMILY.get(name, OTHER_REGISTERS)
+
+    def names(self, family = None):
+        "the names of all registers (of a family), sorted"
+        return sorted(name for name in self._rows if family is None or self.family_of(name) == family)
+
+    def families(self):
+        "the families that have registers in the file, sorted"
+        return sorted(set(self.family_of(name) for name in self._rows))
+
+    def family(self, family):
+        "returns a family's registers, as {name: Registers}"
+        self._decode(family)
+        return dict((name, self._registers[name]) for name in self.names(family) if name in self._registers)
+
+    def __getitem__(self, name):
+        if name not in self._rows:
+            raise KeyError("{0}: no such register".format(name))
+        self._decode(self.family_of(name))
+        if name in self._errors:
+            raise self._errors[name]
+        return self._registers[name]
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def vcpu(self, vcpu):
+        "returns all registers of a vcpu, as {name: value(s)}. registers that aren't per vcpu are included as is"
+        state = {}
+        for family in self.families():
+            for name, registers in self.family(family).items():
+                if not registers.per_vcpu:
+                    state[name] = registers[0]
+                elif vcpu < registers.vcpu_count:
+                    state[name] = registers[vcpu]
+        return state
+
+    def as_dict(self, families = None):
+        "returns the registers (of the given families) as {name: a value per vcpu}"
+        state = {}
+        for family in (families if families is not None else self.families()):
+            for name, registers in self.family(family).items():
+                state[name] = registers.as_list()
+        return state
+
+    def to_json(self, families = None, **kwargs):
+        "the registers as json, byte string values (registers that aren't ints) as hex"
+        state = dict((name, _jsonable(value)) for name, value in self.as_dict(families).items())
+        return json.dumps(state, sort_keys=True, **kwargs)
+
+    def _decode(self, family):
+        if family in self._decoded:
+            return
+        with self._lock:
+            if family in self._decoded:
+                return
+            table = self.group._index
+            names = self.names(family)
+            rows = []
+            for name in names:
+                rows.extend(row for row in self._rows[name] if table.depths[row] == table.depths[self._rows[name][0]])
+            data = self._read_rows(table, rows)
+            for name in names:
+                try:
+                    self._registers[name] = self._build(table, name, data)
+                except ParserException as e:
+                    debug("cpu register {name}: {error}", name=name, error=e)
+                    self._errors[name] = e
+            self._decoded.add(family)
+
+    def _read_rows(self, table, rows):
+        "reads the data of tag rows, returning it by row. uncompressed tags are read together, merging reads of nearby tags"
+        data = {}
+        plain = sorted((table.data_offsets[row], table.data_sizes[row], row) for row in rows if not table.compressed[row])
+        for start, end, merged in _coalesce(plain):
+            chunk = self.parser.reada(start, end - start)
+            for offset, size, row in merged:
+                data[row] = chunk[offset - start:offset - start + size]
+        for row in rows:
+            if table.compressed[row]:
+                data[row] = Tag(self.group, row).read()
+        return data
+
+    def _build(self, table, name, data):
+        "lays out a register's tags into Registers"
+        rows = [row for row in self._rows[name] if row in data]
+        depth = table.depths[rows[0]]
+        vcpu_count = 1
+        shape = [0] * max(0, depth - 1)
+        for row in rows:
+            indices = table.indices(row)
+            if depth:
+                vcpu_count = max(vcpu_count, indices[0] + 1)
+            for i, index in enumerate(indices[1:]):
+                shape[i] = max(shape[i], index + 1)
+        integer = all(len(data[row]) in _INTS for row in rows)
+        registers = Registers(name, vcpu_count, tuple(shape), depth > 0, integer)
+
+        for row in rows:
+            indices = table.indices(row)
+            position = registers._position(indices[0], indices[1:]) if depth else 0
+            if position is None or registers.present[position]:
+                # the first tag in file order wins, same as lookups
+                continue
+            value = data[row]
+            if integer:
+                (value,) = _INTS[len(value)].unpack(value)
+            registers.values[position] = value
+            registers.present[position] = 1
+        return registers
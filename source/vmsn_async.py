@@ -0,0 +1,252 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+This file provides an asyncio interface over the vmsn Parser (python 3.7+).
+
+all blocking work (opening files, building tag indices, reading data) runs
+on a thread pool shared by every AsyncParser, the Parser is thread safe for
+all of it. concurrent reads of the same bytes are coalesced into a single
+read, and every file caps its own in-flight reads, so one event loop can
+serve many open snapshots with bounded memory.
+
+usage:
+    parser = await AsyncParser.open("snapshot.vmss")
+    cr3 = await (await parser.tag("cpu", "CR", 0, 3)).read_long()
+    memory = await parser.memory()
+    page = await memory.read(0x1000, 4096)
+    await parser.close()
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# the vmsn/vmss parser
+import vmsn
+
+# the number of reads every file may have running at once
+DEFAULT_MAX_IN_FLIGHT = 8
+# the number of threads of the shared executor
+DEFAULT_WORKERS = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def shared_executor():
+    "returns the thread pool used by every AsyncParser that isn't given its own executor"
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(DEFAULT_WORKERS, thread_name_prefix="vmsn")
+    return _executor
+
+def _retrieve(future):
+    # mark the exception as retrieved even when every waiter was cancelled, avoiding asyncio's warning
+    if not future.cancelled():
+        future.exception()
+
+class AsyncParser():
+    """asyncio wrapper of a vmsn Parser.
+
+    executor is the concurrent.futures executor blocking calls run on (the shared one by default), max_in_flight caps the
+    number of reads running at once for this file. reads (and tag index builds) of the same data that are already running are
+    shared instead of being submitted again; the reads and coalesced attributes count both."""
+    def __init__(self, parser, executor = None, max_in_flight = DEFAULT_MAX_IN_FLIGHT):
+        self.parser = parser
+        self.executor = executor if executor is not None else shared_executor()
+        self.max_in_flight = max_in_flight
+        self.reads = 0
+        self.coalesced = 0
+        self._fh = None
+        self._slots = None
+        self._pending = {}
+        self._memory = None
+
+    @classmethod
+    async def open(cls, path, executor = None, max_in_flight = DEFAULT_MAX_IN_FLIGHT, **parser_kwargs):
+        "opens a snapshot file without blocking the event loop. the file is closed along with the parser"
+        executor = executor if executor is not None else shared_executor()
+        loop = asyncio.get_running_loop()
+        fh = await loop.run_in_executor(executor, open, path, "rb")
+        try:
+            parser = await loop.run_in_executor(executor, functools.partial(vmsn.Parser, fh, **parser_kwargs))
+        except BaseException:
+            fh.close()
+            raise
+        self = cls(parser, executor, max_in_flight)
+        self._fh = fh
+        return self
+
+    async def _run(self, key, func, *args):
+        """runs func(*args) on the executor within the file's in-flight cap. while a call with the same key is running,
+        callers wait for its result instead. a cancelled caller doesn't cancel the call for the others"""
+        future = self._pending.get(key) if key is not None else None
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(self._submit(func, *args))
+            future.add_done_callback(_retrieve)
+            if key is not None:
+                self._pending[key] = future
+                future.add_done_callback(functools.partial(self._done, key))
+        return await asyncio.shield(future)
+
+    def _done(self, key, future):
+        if self._pending.get(key) is future:
+            del self._pending[key]
+
+    async def _submit(self, func, *args):
+        # the semaphore is created on first use, so it belongs to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        async with self._slots:
+            self.reads += 1
+            return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def group(self, group_ident):
+        "returns the AsyncGroup named group_ident, raising KeyError if there isn't one"
+        return AsyncGroup(self, self.parser[group_ident])
+
+    async def tag(self, group_ident, tag_ident, *indices):
+        "returns the tag at group_ident/tag_ident[indices...] as an AsyncTag, or an AsyncMetaTag for partial indices"
+        return await (await self.group(group_ident)).tag(tag_ident, *indices)
+
+    async def memory(self):
+        "returns the snapshot's guest physical memory as AsyncPhysicalMemory"
+        if self._memory is None:
+            memory = await self._run(("memory",), vmsn.PhysicalMemory, self.parser)
+            if self._memory is None:
+                self._memory = AsyncPhysicalMemory(self, memory)
+        return self._memory
+
+    async def close(self):
+        "waits for running reads, then closes the parser (and the file, if it was opened by AsyncParser.open)"
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._close)
+
+    def _close(self):
+        self.parser.close()
+        if self._fh is not None:
+            self._fh.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+class AsyncGroup():
+    def __init__(self, async_parser, group):
+        self.async_parser = async_parser
+        self.group = group
+        self.name = group.name
+
+    async def _index(self):
+        # building the group's tag index reads the whole tag list, do it once on the executor
+        if self.group._index is None:
+            await self.async_parser._run(("index", self.group.index), self.group._get_index)
+
+    async def tags(self):
+        "returns all tags of the group (as vmsn Tag objects), in file order"
+        await self._index()
+        return list(self.group.tags())
+
+    async def tag(self, tag_ident, *indices):
+        "returns an AsyncTag, or an AsyncMetaTag for partial indices. raises KeyError if there's no such tag"
+        await self._index()
+        # with the index built, lookups don't touch the file
+        try:
+            tag = self.group[tag_ident]
+            for index in indices:
+                tag = tag[index]
+        except (KeyError, AttributeError):
+            raise KeyError("{0}: tag {1}{2} not found".format(self.name, tag_ident, list(indices)))
+        if isinstance(tag, vmsn.MetaTag):
+            return AsyncMetaTag(self, tag.name, tag.indices)
+        return AsyncTag(self.async_parser, tag)
+
+    def __str__(self):
+        return self.name
+
+class AsyncMetaTag():
+    def __init__(self, async_group, name, indices):
+        self.async_group = async_group
+        self.name = name
+        self.indices = indices
+
+    async def tag(self, *indices):
+        return await self.async_group.tag(self.name, *(self.indices + indices))
+
+class AsyncTag():
+    def __init__(self, async_parser, tag):
+        self.async_parser = async_parser
+        self.tag = tag
+        self.name = tag.name
+        self.indices = tag.indices
+        self.size = tag.size
+
+    async def read(self, offset = 0, size = -1):
+        "reads the tag's data (decompressed for compressed tags)"
+        if size == -1:
+            size = self.size - offset
+        return await self.async_parser._run(("tag", self.tag.data_offset, offset, size), self.tag.read, offset, size)
+
+    async def _read_int(self, method):
+        return await self.async_parser._run(("int", self.tag.data_offset, method), getattr(self.tag, method))
+
+    async def read_offset(self):
+        return await self._read_int("read_offset")
+
+    async def read_long_long(self):
+        return await self._read_int("read_long_long")
+
+    async def read_long(self):
+        return await self._read_int("read_long")
+
+    async def read_byte(self):
+        return await self._read_int("read_byte")
+
+class AsyncPhysicalMemory():
+    "awaitable reads of guest physical memory, see vmsn.PhysicalMemory"
+    def __init__(self, async_parser, memory):
+        self.async_parser = async_parser
+        self.memory = memory
+        self.runs = memory.runs
+
+    def translate(self, paddr):
+        return self.memory.translate(paddr)
+
+    def is_valid_address(self, paddr):
+        return self.memory.is_valid_address(paddr)
+
+    async def read(self, paddr, size):
+        "reads size bytes at a physical address, None if any of it isn't mapped"
+        return await self.async_parser._run(("pread", paddr, size), self.memory.read, paddr, size)
+
+    async def zread(self, paddr, size):
+        "reads size bytes at a physical address, zero filling unmapped ranges"
+        return await self.async_parser._run(("pzread", paddr, size), self.memory.zread, paddr, size)
+
+    async def read_many(self, requests):
+        "reads a list of (paddr, size) requests in a single call to the executor, see PhysicalMemory.read_many"
+        return await self.async_parser._run(None, self.memory.read_many, list(requests))
@@ -0,0 +1,328 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+This file scans large collections of VMSN/VMSS files in parallel,
+pulling a configurable set of groups and tags out of every file and
+writing a json line per file as soon as it is done.
+
+Files are spread over worker processes. every file has its own timeout and
+errors are reported in the file's result, so a single bad or slow file
+never stalls the batch: the parent enforces the timeouts, and kills
+workers that hang or replaces ones that crash (i.e. SIGBUS on a mapped
+file that was truncated), reporting the file as an error.
+
+usage: python vmsn_batch.py [-j N] [--timeout SECONDS] [--fields version,cpu,...] [--tag group/tag[i]] path [path ...]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import signal
+import argparse
+import multiprocessing
+
+# waits on worker pipes and exits at once. not available on python 2, which polls instead
+try:
+    from multiprocessing.connection import wait as _connection_wait
+except ImportError:
+    _connection_wait = None
+
+# the vmsn/vmss parser
+import vmsn
+
+SNAPSHOT_EXTENSIONS = (".vmsn", ".vmss")
+
+FIELDS = ("version", "groups", "memory_size", "regions", "cpu")
+DEFAULT_FIELDS = ("version", "memory_size", "regions", "cpu")
+
+# a worker still scanning a file this long after its timeout is killed. the worker's own SIGALRM timeout (where there is
+# one) normally fires first, and leaves the worker running
+KILL_GRACE = 1.0
+# workers are replaced after this many files, so a leak while scanning a file doesn't build up
+MAX_TASKS_PER_WORKER = 256
+# how often the parent checks on workers, where it can't wait for their pipes and exits (python 2)
+POLL_INTERVAL = 0.01
+
+_TAG_SPEC = re.compile(r"^([^/]+)/([^\[\]]+)((?:\[\d+\])*)$")
+
+class ScanTimeout(Exception):
+    "raised inside a worker when a file takes longer than its timeout"
+    pass
+
+def _indices_key(indices):
+    return "".join("[{0}]".format(index) for index in indices)
+
+def read_tag_spec(parser, spec):
+    """reads the tags described by a "group/tag[i][j]" spec. full indices return the tag's value, missing (or partial)
+    indices return a {"[i][j]": value} dict of every tag with that name (and indices prefix)"""
+    match = _TAG_SPEC.match(spec)
+    if not match:
+        raise ValueError("Invalid tag spec {0}, should be group/tag[index]...".format(spec))
+    group_name, tag_name, indices = match.groups()
+    indices = tuple(int(index) for index in re.findall(r"\d+", indices))
+
+    group = parser[group_name]
+    tag = group[tag_name]
+    for index in indices:
+        tag = tag[index]
+    if isinstance(tag, vmsn.Tag):
+        return vmsn.tag_value(tag)
+
+    values = {}
+    for tag in group.tags():
+        if tag.name == tag_name and tag.indices[:len(indices)] == indices:
+            values[_indices_key(tag.indices)] = vmsn.tag_value(tag)
+    return values
+
+def _cpu_registers(parser):
+    "every tag of the cpu group, by name and then indices. the first index is the vcpu"
+    registers = {}
+    group = parser["cpu"]
+    for tag in group.tags():
+        registers.setdefault(tag.name, {})[_indices_key(tag.indices)] = vmsn.tag_value(tag)
+    return registers
+
+def scan_file(path, fields = DEFAULT_FIELDS, tags = (), index_cache = None):
+    "opens a snapshot and returns a dict with the requested fields and tag specs"
+    result = {"path": path}
+    with open(path, "rb") as fh:
+        parser = vmsn.Parser(fh, index_cache=index_cache)
+        memory = None
+        if "memory_size" in fields or "regions" in fields:
+            memory = vmsn.PhysicalMemory(parser)
+
+        for field in fields:
+            if field == "version":
+                result["version"] = parser.version
+            elif field == "groups":
+                result["groups"] = [group.name for group in parser]
+            elif field == "memory_size":
+                result["memory_size"] = sum(length for _, length in memory.ranges())
+            elif field == "regions":
+                result["regions"] = memory.runs
+            elif field == "cpu":
+                result["cpu"] = _cpu_registers(parser)
+            else:
+                raise ValueError("Unknown field {0}".format(field))
+
+        if tags:
+            result["tags"] = {}
+            for spec in tags:
+                try:
+                    result["tags"][spec] = read_tag_spec(parser, spec)
+                except (KeyError, AttributeError):
+                    result["tags"][spec] = None
+                    result.setdefault("missing", []).append(spec)
+        parser.close()
+    return result
+
+def _alarm(signum, frame):
+    raise ScanTimeout()
+
+def _scan_task(task):
+    "runs in a worker process: scans a single file, turning timeouts and errors into the file's result"
+    path, fields, tags, timeout, index_cache = task
+    start = time.time()
+    # without SIGALRM (windows) only the parent's timeout applies, which kills the worker
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _alarm)
+    try:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        result = scan_file(path, fields, tags, index_cache)
+    except ScanTimeout:
+        result = {"path": path, "error": "timeout after {0}s".format(timeout)}
+    except Exception as e:
+        result = {"path": path, "error": "{0}: {1}".format(type(e).__name__, e)}
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    result["elapsed"] = round(time.time() - start, 6)
+    return result
+
+def _init_worker():
+    # let the parent handle ^C, so it can stop the pool cleanly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def find_snapshots(inputs, recursive = True):
+    "yields the snapshot files in the given paths: files are used as is, directories are searched for .vmsn/.vmss files"
+    for path in inputs:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.lower().endswith(SNAPSHOT_EXTENSIONS):
+                    yield os.path.join(dir_path, file_name)
+            if not recursive:
+                break
+
+def _worker_main(conn):
+    "a worker process: scans the files sent over its pipe, sending back every file's result"
+    _init_worker()
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        conn.send(_scan_task(task))
+
+class _Worker():
+    "a worker process, its pipe and the file it is scanning"
+    def __init__(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_conn,))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started = None
+        self.tasks = 0
+
+    def start(self, task):
+        self.task = task
+        self.tasks += 1
+        self.started = time.time()
+        self.conn.send(task)
+
+    def result(self):
+        "the result of the running file if there's one, or None"
+        try:
+            if self.conn.poll():
+                return self.conn.recv()
+        except (EOFError, EnvironmentError):
+            pass
+        return None
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+def _wait(workers, timeout):
+    "waits until a worker has a result or exits, or the first running file's timeout (plus KILL_GRACE) passes"
+    deadline = None
+    if timeout:
+        deadline = max(0, min(worker.started for worker in workers) + timeout + KILL_GRACE - time.time())
+    if _connection_wait is not None:
+        _connection_wait([worker.conn for worker in workers] + [worker.process.sentinel for worker in workers], deadline)
+    else:
+        workers[0].conn.poll(POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, deadline))
+
+def scan(paths, fields = DEFAULT_FIELDS, tags = (), timeout = None, processes = None, index_cache = None):
+    """scans snapshot files over worker processes, yielding every file's result as soon as it is done (not in input order).
+    a result has the file's path, the requested fields, the elapsed seconds and an "error" if the file failed.
+
+    timeouts are enforced by this (parent) process: a worker still running a file KILL_GRACE seconds after its timeout is
+    killed, so it holds on platforms without SIGALRM (windows) and for files stuck where the alarm can't interrupt them.
+    a worker that dies (i.e. killed by a signal) is replaced, and its file reported as an error"""
+    tasks = ((path, tuple(fields), tuple(tags), timeout, index_cache) for path in paths)
+    workers = []
+    try:
+        workers = [_Worker() for _ in range(0, processes or multiprocessing.cpu_count())]
+        while True:
+            ## give every idle worker a file, replacing workers that are done with MAX_TASKS_PER_WORKER files
+            for worker_i, worker in enumerate(workers):
+                if worker.task is not None:
+                    continue
+                task = next(tasks, None)
+                if task is None:
+                    break
+                if worker.tasks >= MAX_TASKS_PER_WORKER or not worker.process.is_alive():
+                    worker.stop()
+                    worker = workers[worker_i] = _Worker()
+                worker.start(task)
+
+            busy = [worker for worker in workers if worker.task is not None]
+            if not busy:
+                break
+            _wait(busy, timeout)
+
+            for worker_i, worker in enumerate(workers):
+                if worker.task is None:
+                    continue
+                path = worker.task[0]
+                result = worker.result()
+                if result is None:
+                    # the result may have been sent right before the worker exited
+                    if not worker.process.is_alive():
+                        result = worker.result()
+                        if result is None:
+                            result = {"path": path, "error": "worker died (exit code {0})".format(worker.process.exitcode)}
+                    elif timeout and time.time() - worker.started > timeout + KILL_GRACE:
+                        result = {"path": path, "error": "timeout after {0}s, worker killed".format(timeout)}
+                    else:
+                        continue
+                    if "error" in result:
+                        result["elapsed"] = round(time.time() - worker.started, 6)
+                        worker.stop()
+                        workers[worker_i] = _Worker()
+                worker.task = None
+                yield result
+    finally:
+        for worker in workers:
+            worker.stop()
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(description="Scan VMware snapshots (vmsn/vmss) in parallel, writing a json line per file")
+    arg_parser.add_argument("paths", nargs="*", help="snapshot files or directories")
+    arg_parser.add_argument("-l", "--file-list", help="read snapshot paths from a file (one per line, - for stdin)")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: number of cpus)")
+    arg_parser.add_argument("-t", "--timeout", type=float, default=60, help="per file timeout in seconds (0 for none)")
+    arg_parser.add_argument("-f", "--fields", default=",".join(DEFAULT_FIELDS),
+                            help="comma separated fields out of {0} (default: %(default)s)".format(", ".join(FIELDS)))
+    arg_parser.add_argument("--tag", dest="tags", action="append", default=[], help="extra tag to read, as group/tag[i][j]")
+    arg_parser.add_argument("--no-recursive", dest="recursive", action="store_false", help="don't search directories recursively")
+    arg_parser.add_argument("--index-cache", metavar="DIR", help="use an on-disk index cache in DIR")
+    args = arg_parser.parse_args(argv)
+
+    fields = [field for field in args.fields.split(",") if field]
+    for field in fields:
+        if field not in FIELDS:
+            arg_parser.error("unknown field {0}".format(field))
+
+    inputs = list(args.paths)
+    if args.file_list:
+        list_fh = sys.stdin if args.file_list == "-" else open(args.file_list)
+        inputs.extend(line.strip() for line in list_fh if line.strip())
+    if not inputs:
+        arg_parser.error("no snapshots given")
+
+    index_cache = vmsn.IndexCache(args.index_cache) if args.index_cache else None
+    start = time.time()
+    count = errors = 0
+    for result in scan(find_snapshots(inputs, args.recursive), fields, args.tags, args.timeout or None, args.jobs, index_cache):
+        sys.stdout.write(json.dumps(result, sort_keys=True) + "\n")
+        sys.stdout.flush()
+        count += 1
+        errors += "error" in result
+
+    elapsed = max(time.time() - start, 1e-6)
+    sys.stderr.write("{count} files, {errors} errors in {elapsed:.1f}s ({rate:.1f} files/s)\n".format(count=count, errors=errors,
+                     elapsed=elapsed, rate=count / elapsed))
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+This file compares two VMSN/VMSS files, usually two snapshots of the same
+virtual machine: which tags of every group changed (cpu registers, device
+state...), and which guest physical pages changed.
+
+memory is compared in large chunks, going down to single pages only inside
+chunks that differ. pages that are in the memory regions of only one of the
+files are reported as added or removed. page hash tables saved by vmsn_hash
+can be used instead of reading the memory itself.
+
+usage: python vmsn_diff.py [--table-a A.vmsnhash] [--table-b B.vmsnhash] [--json] a.vmss b.vmss
+"""
+
+import sys
+import json
+import argparse
+from functools import partial
+
+# the vmsn/vmss parser
+import vmsn
+import vmsn_hash
+
+# memory is compared this many bytes at a time
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# tags compared as part of the memory diff, not the state diff
+MEMORY_TAGS = (("memory", "Memory"),)
+
+def _tag_key(tag):
+    return tag.name + "".join("[{0}]".format(index) for index in tag.indices)
+
+def _group_tags(group):
+    "the group's tags by key, the first tag wins (same as a lookup would)"
+    tags = {}
+    for tag in group.tags():
+        tags.setdefault(_tag_key(tag), tag)
+    return tags
+
+def _same_data(tag_a, tag_b, chunk_size = CHUNK_SIZE):
+    if tag_a.size != tag_b.size:
+        return False
+    for offset in range(0, tag_a.size, chunk_size):
+        size = min(chunk_size, tag_a.size - offset)
+        if tag_a.read(offset, size) != tag_b.read(offset, size):
+            return False
+    return True
+
+def diff_state(parser_a, parser_b, skip = MEMORY_TAGS):
+    """Compares the tags of every group, returning {group name: {"added": [...], "removed": [...], "changed": [...]}} for the
+    groups that differ. tags are named as "name[i][j]", changed tags are dicts with the tag, and its old and new values
+    (see vmsn.tag_value). groups only in one of the files have all their tags added or removed."""
+    groups_a = [group.name for group in parser_a]
+    groups_b = [group.name for group in parser_b]
+    result = {}
+    for group_name in groups_a + [name for name in groups_b if name not in groups_a]:
+        group_a = parser_a[group_name] if group_name in groups_a else None
+        group_b = parser_b[group_name] if group_name in groups_b else None
+        tags_a = _group_tags(group_a) if group_a is not None else {}
+        tags_b = _group_tags(group_b) if group_b is not None else {}
+
+        changed = []
+        for key in sorted(set(tags_a) & set(tags_b)):
+            if (group_name, tags_a[key].name) in skip:
+                continue
+            tag_a = tags_a[key]
+            tag_b = tags_b[key]
+            if not _same_data(tag_a, tag_b):
+                changed.append({"tag": key, "old": vmsn.tag_value(tag_a), "new": vmsn.tag_value(tag_b)})
+
+        added = sorted(set(tags_b) - set(tags_a))
+        removed = sorted(set(tags_a) - set(tags_b))
+        if changed or added or removed:
+            result[group_name] = {"added": added, "removed": removed, "changed": changed}
+    return result
+
+class _PageRanges():
+    "collects page numbers (in increasing order) as (first ppn, page count) ranges"
+    def __init__(self):
+        self.ranges = []
+        self.pages = 0
+
+    def add(self, ppn, count = 1):
+        self.pages += count
+        if self.ranges and self.ranges[-1][0] + self.ranges[-1][1] == ppn:
+            self.ranges[-1][1] += count
+        else:
+            self.ranges.append([ppn, count])
+
+def _overlay(ranges_a, ranges_b):
+    """ranges are sorted (first ppn, page count, base) tuples, where base is the position of the first page (a page of
+    the memory tag or a row of a hash table). yields (first ppn, page count, base a, base b) for every stretch of pages
+    that is mapped the same way in both, with None as the base of a side that doesn't map it"""
+    bounds = sorted(set([first for first, _, _ in ranges_a + ranges_b] +
+                        [first + count for first, count, _ in ranges_a + ranges_b]))
+
+    def base(ranges, ppn, state):
+        # ranges are sorted and ppn only grows, so keep a cursor instead of searching
+        i = state[0]
+        while i < len(ranges) and ranges[i][0] + ranges[i][1] <= ppn:
+            i += 1
+        state[0] = i
+        if i < len(ranges) and ranges[i][0] <= ppn:
+            return ranges[i][2] + ppn - ranges[i][0]
+        return None
+
+    state_a = [0]
+    state_b = [0]
+    for first, end in zip(bounds, bounds[1:]):
+        base_a = base(ranges_a, first, state_a)
+        base_b = base(ranges_b, first, state_b)
+        if base_a is not None or base_b is not None:
+            yield first, end - first, base_a, base_b
+
+def _memory_ranges(memory):
+    return [(memory_offset // vmsn.PAGE_SIZE, (length + vmsn.PAGE_SIZE - 1) // vmsn.PAGE_SIZE, tag_offset // vmsn.PAGE_SIZE)
+            for memory_offset, tag_offset, length in memory.runs]
+
+def _table_ranges(table):
+    return [(first_ppn, count, row) for (first_ppn, count), row in zip(table.regions, table._rows)]
+
+def _read_pages(tag, page, count):
+    "reads count pages of the memory tag, zero padding a partial last page"
+    offset = page * vmsn.PAGE_SIZE
+    size = count * vmsn.PAGE_SIZE
+    data = tag.read(offset, min(size, tag.size - offset))
+    if len(data) < size:
+        data += b"\x00" * (size - len(data))
+    return data
+
+def _table_reader(table, row):
+    "reads the digests of count pages from row on"
+    size = table.digest_size
+    return lambda page, count: table.digests[(row + page) * size:(row + page + count) * size]
+
+def _memory_reader(tag, base):
+    "reads count pages from the memory tag's page base on"
+    return lambda page, count: _read_pages(tag, base + page, count)
+
+def _compare(result, first, count, chunk_pages, page_size, read_a, read_b):
+    """compares count pages a chunk at a time, then page by page inside chunks that differ.
+    read_a and read_b return the data of n pages from a page on, page_size bytes per page"""
+    for chunk in range(0, count, chunk_pages):
+        n = min(chunk_pages, count - chunk)
+        data_a = read_a(chunk, n)
+        data_b = read_b(chunk, n)
+        if data_a == data_b:
+            continue
+        for i in range(0, n):
+            start = i * page_size
+            if data_a[start:start + page_size] != data_b[start:start + page_size]:
+                result.add(first + chunk + i)
+
+def diff_memory(parser_a, parser_b, table_a = None, table_b = None, chunk_size = CHUNK_SIZE):
+    """Compares the guest physical memory of two snapshots, returning a dict with the "changed", "added" and "removed"
+    pages as [first ppn, page count] ranges, and the number of pages of each kind.
+
+    given a hash table (vmsn_hash.PageHashTable) of either snapshot, pages are compared by digest. the other snapshot's table is
+    then computed with the same algorithm if it isn't given. without tables memory is compared directly, chunk_size bytes at a time."""
+    changed = _PageRanges()
+    added = _PageRanges()
+    removed = _PageRanges()
+
+    if table_a is not None or table_b is not None:
+        algorithm = (table_a if table_a is not None else table_b).algorithm
+        if table_a is None:
+            table_a = vmsn_hash.hash_pages(parser_a, algorithm)
+        if table_b is None:
+            table_b = vmsn_hash.hash_pages(parser_b, algorithm)
+        if table_a.algorithm != table_b.algorithm:
+            raise ValueError("Can't compare hash tables of different algorithms", table_a.algorithm, table_b.algorithm)
+        ranges_a, ranges_b = _table_ranges(table_a), _table_ranges(table_b)
+        reader_a, reader_b = partial(_table_reader, table_a), partial(_table_reader, table_b)
+        unit = table_a.digest_size
+    else:
+        memory_a, memory_b = vmsn.PhysicalMemory(parser_a), vmsn.PhysicalMemory(parser_b)
+        ranges_a, ranges_b = _memory_ranges(memory_a), _memory_ranges(memory_b)
+        reader_a, reader_b = partial(_memory_reader, memory_a.tag), partial(_memory_reader, memory_b.tag)
+        unit = vmsn.PAGE_SIZE
+
+    chunk_pages = max(1, chunk_size // vmsn.PAGE_SIZE)
+    for first, count, base_a, base_b in _overlay(ranges_a, ranges_b):
+        if base_a is None:
+            added.add(first, count)
+        elif base_b is None:
+            removed.add(first, count)
+        else:
+            _compare(changed, first, count, chunk_pages, unit, reader_a(base_a), reader_b(base_b))
+
+    return {"changed": changed.ranges, "added": added.ranges, "removed": removed.ranges,
+            "changed_pages": changed.pages, "added_pages": added.pages, "removed_pages": removed.pages}
+
+def diff(parser_a, parser_b, state = True, memory = True, table_a = None, table_b = None):
+    "compares two snapshots, returning the diff_state and diff_memory results (as \"state\" and \"memory\") for the parts requested"
+    result = {}
+    if state:
+        result["state"] = diff_state(parser_a, parser_b)
+    if memory:
+        result["memory"] = diff_memory(parser_a, parser_b, table_a, table_b)
+    return result
+
+def _format_value(value):
+    if isinstance(value, dict):
+        return "{0} bytes {1}{2}".format(value["size"], value["hex"], "..." if value["size"] > vmsn.MAX_VALUE_BYTES else "")
+    return "{0:#x}".format(value)
+
+def report(result, stream = sys.stdout):
+    "writes a diff as readable text"
+    for group_name, group in sorted(result.get("state", {}).items()):
+        stream.write("group {0}: {1} changed, {2} added, {3} removed\n".format(group_name, len(group["changed"]),
+                     len(group["added"]), len(group["removed"])))
+        for tag in group["changed"]:
+            stream.write("  changed {0}: {1} -> {2}\n".format(tag["tag"], _format_value(tag["old"]), _format_value(tag["new"])))
+        for key in group["added"]:
+            stream.write("  added {0}\n".format(key))
+        for key in group["removed"]:
+            stream.write("  removed {0}\n".format(key))
+
+    memory = result.get("memory")
+    if memory is not None:
+        stream.write("memory: {0} changed, {1} added, {2} removed pages\n".format(memory["changed_pages"], memory["added_pages"],
+                     memory["removed_pages"]))
+        for kind in ("changed", "added", "removed"):
+            for first, count in memory[kind]:
+                stream.write("  {0} ppn {1:#x}-{2:#x} ({3} pages)\n".format(kind, first, first + count - 1, count))
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(description="Compare two VMware snapshots (vmsn/vmss)")
+    arg_parser.add_argument("snapshot_a", help="the old vmsn/vmss file")
+    arg_parser.add_argument("snapshot_b", help="the new vmsn/vmss file")
+    arg_parser.add_argument("--table-a", help="page hash table of the old snapshot (see vmsn_hash)")
+    arg_parser.add_argument("--table-b", help="page hash table of the new snapshot (see vmsn_hash)")
+    arg_parser.add_argument("--no-state", dest="state", action="store_false", help="don't compare tags")
+    arg_parser.add_argument("--no-memory", dest="memory", action="store_false", help="don't compare guest memory")
+    arg_parser.add_argument("--json", action="store_true", help="write the diff as json")
+    args = arg_parser.parse_args(argv)
+
+    table_a = vmsn_hash.load_table(args.table_a) if args.table_a else None
+    table_b = vmsn_hash.load_table(args.table_b) if args.table_b else None
+    with open(args.snapshot_a, "rb") as fh_a:
+        with open(args.snapshot_b, "rb") as fh_b:
+            parser_a = vmsn.Parser(fh_a)
+            parser_b = vmsn.Parser(fh_b)
+            result = diff(parser_a, parser_b, args.state, args.memory, table_a, table_b)
+            parser_a.close()
+            parser_b.close()
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        report(result)
+    changes = any(result.get("state", {}).values()) or any(result.get("memory", {}).get(kind + "_pages")
+                                                          for kind in ("changed", "added", "removed"))
+    return 1 if changes else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+This file exports the guest physical memory saved in VMSN/VMSS files
+into formats other tools can read directly:
+raw (a flat image, gaps between regions left as holes),
+ELF core (one PT_LOAD segment per memory region) and LiME.
+
+by default (sparse), memory is read through the parser and zero pages are
+left as holes. with --no-sparse, uncompressed memory is copied by the kernel
+(copy_file_range or sendfile) instead, as it has to be looked at to find
+the zero pages otherwise.
+
+usage: python vmsn_export.py [-f raw|elf|lime] [--no-sparse] snapshot.vmss output
+"""
+
+import struct
+import os
+import sys
+import time
+import argparse
+import logging
+
+# the vmsn/vmss parser
+import vmsn
+
+FORMATS = ("raw", "elf", "lime")
+
+# memory is copied in chunks of this size, aligned to the chunk size within the memory tag
+CHUNK_SIZE = 8 * 1024 * 1024
+
+ZERO_PAGE = b"\x00" * vmsn.PAGE_SIZE
+ZERO_CHUNK = b"\x00" * CHUNK_SIZE
+
+## ELF core structures
+_ELF_HEADER = struct.Struct("<16sHHIQQQIHHHHHH")
+_ELF_PHDR = struct.Struct("<IIQQQQQQ")
+ET_CORE = 4
+EM_X86_64 = 62
+PT_LOAD = 1
+PF_RWX = 7
+
+## LiME range header: magic, version, start address, end address (inclusive) and 8 reserved bytes
+_LIME_HEADER = struct.Struct("<IIQQ8s")
+LIME_MAGIC = 0x4C694D45
+LIME_VERSION = 1
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+def layout(memory, format = "raw"):
+    """returns the output layout for the memory's runs as (output offset, header, tag offset, length) tuples, along with the
+    data written before the first segment (the ELF headers) and the output's total size"""
+    if format not in FORMATS:
+        raise ValueError("Unknown export format {0}, should be one of {1}".format(format, ", ".join(FORMATS)))
+
+    segments = []
+    prefix = b""
+    if format == "raw":
+        # physical addresses are output offsets, gaps are left as holes
+        for memory_offset, tag_offset, length in memory.runs:
+            segments.append((memory_offset, b"", tag_offset, length))
+        size = max([memory_offset + length for memory_offset, _, length in memory.runs] or [0])
+    elif format == "elf":
+        phnum = len(memory.runs)
+        if phnum >= 0xffff:
+            raise ValueError("Too many memory regions for an ELF core", phnum)
+        phdrs_end = _ELF_HEADER.size + phnum * _ELF_PHDR.size
+        out_offset = _align(phdrs_end, vmsn.PAGE_SIZE)
+
+        ident = b"\x7fELF" + struct.pack("<BBBB", 2, 1, 1, 0)
+        prefix = _ELF_HEADER.pack(ident, ET_CORE, EM_X86_64, 1, 0, _ELF_HEADER.size, 0, 0,
+                                  _ELF_HEADER.size, _ELF_PHDR.size, phnum, 0, 0, 0)
+        for memory_offset, tag_offset, length in memory.runs:
+            prefix += _ELF_PHDR.pack(PT_LOAD, PF_RWX, out_offset, memory_offset, memory_offset, length, length, vmsn.PAGE_SIZE)
+            segments.append((out_offset, b"", tag_offset, length))
+            out_offset += length
+        size = out_offset
+    else:
+        out_offset = 0
+        for memory_offset, tag_offset, length in memory.runs:
+            header = _LIME_HEADER.pack(LIME_MAGIC, LIME_VERSION, memory_offset, memory_offset + length - 1, b"\x00" * 8)
+            segments.append((out_offset, header, tag_offset, length))
+            out_offset += len(header) + length
+        size = out_offset
+
+    return prefix, segments, size
+
+class _Output():
+    """writes the export, skipping over holes when the output is seekable (and writing zeros when it isn't)"""
+    def __init__(self, fh, sparse):
+        self.fh = fh
+        self.pos = 0
+        self.written = 0
+        try:
+            fh.seek(0, os.SEEK_CUR)
+            self.seekable = True
+        except (AttributeError, EnvironmentError, ValueError):
+            self.seekable = False
+        self.sparse = sparse and self.seekable
+        try:
+            self.fd = fh.fileno() if self.seekable else None
+        except (AttributeError, EnvironmentError, ValueError):
+            self.fd = None
+
+    def skip(self, size):
+        "moves the output forward, without writing anything if possible"
+        if self.seekable:
+            self.pos += size
+            return
+        while size > 0:
+            n = min(size, CHUNK_SIZE)
+            self.fh.write(ZERO_CHUNK[:n])
+            size -= n
+            self.pos += n
+
+    def write(self, data):
+        if self.seekable and self.fh.tell() != self.pos:
+            self.fh.seek(self.pos)
+        self.fh.write(data)
+        self.pos += len(data)
+        self.written += len(data)
+
+    def write_sparse(self, data):
+        "writes data, leaving holes for pages that are all zeros"
+        if not self.sparse:
+            return self.write(data)
+        if data == ZERO_CHUNK[:len(data)]:
+            return self.skip(len(data))
+
+        # write consecutive non-zero pages together
+        start = None
+        for page_offset in range(0, len(data), vmsn.PAGE_SIZE):
+            zero = data[page_offset:page_offset + vmsn.PAGE_SIZE] == ZERO_PAGE[:min(vmsn.PAGE_SIZE, len(data) - page_offset)]
+            if zero and start is not None:
+                self.write(memoryview(data)[start:page_offset])
+                start = None
+            if zero:
+                self.skip(min(vmsn.PAGE_SIZE, len(data) - page_offset))
+            elif start is None:
+                start = page_offset
+        if start is not None:
+            self.write(memoryview(data)[start:])
+
+    def copy(self, src_fd, src_offset, size):
+        """copies from another file inside the kernel (copy_file_range, or sendfile if that fails). returns the number of bytes
+        copied, which is less than size if the kernel can't copy between these files"""
+        if self.fd is None:
+            return 0
+
+        self.fh.flush()
+        done = 0
+        for name in ("copy_file_range", "sendfile"):
+            kernel_copy = getattr(os, name, None)
+            if kernel_copy is None:
+                continue
+            try:
+                while done < size:
+                    if name == "copy_file_range":
+                        n = kernel_copy(src_fd, self.fd, size - done, src_offset + done, self.pos + done)
+                    else:
+                        os.lseek(self.fd, self.pos + done, os.SEEK_SET)
+                        n = kernel_copy(self.fd, src_fd, src_offset + done, size - done)
+                    if n == 0:
+                        break
+                    done += n
+                break
+            except OSError as e:
+                vmsn.debug("{0} failed after {1} bytes: {2}", name, done, e)
+        if done < size:
+            vmsn.debug("kernel copied {0} of {1} bytes, reading and writing the rest", done, size)
+
+        # keep the file object's position in sync with whatever the kernel wrote
+        self.fh.seek(self.pos + done)
+        self.pos += done
+        self.written += done
+        return done
+
+    def finish(self, size):
+        "makes sure the output has its full size, even if it ends with a hole"
+        if self.seekable:
+            self.fh.truncate(size)
+        else:
+            self.skip(size - self.pos)
+        self.fh.flush()
+
+def export(parser, fh, format = "raw", sparse = True, progress = None):
+    """Streams the guest physical memory of a parsed snapshot to a binary file object, in one of the FORMATS.
+
+    Memory is copied in large chunks. with sparse set (the default) and a seekable output, pages that are all zeros are
+    skipped, leaving holes in the output (raw exports always leave holes for the gaps between regions).
+    the kernel copy (copy_file_range or sendfile) is only used without sparse, for uncompressed memory and a file output:
+    sparse exports read every chunk to look for zero pages.
+    progress, if given, is called as progress(bytes done, total bytes) after every chunk.
+    returns the size of the output."""
+    memory = vmsn.PhysicalMemory(parser)
+    prefix, segments, size = layout(memory, format)
+    total = sum(length for _, _, _, length in segments)
+
+    # the kernel can only copy data that is stored as is in the snapshot file
+    src_fd = None
+    if not sparse and not memory.tag.compressed:
+        try:
+            src_fd = parser.fh.fileno()
+        except (AttributeError, EnvironmentError, ValueError):
+            pass
+
+    out = _Output(fh, sparse)
+    out.write(prefix)
+    done = 0
+    for out_offset, header, tag_offset, length in segments:
+        out.skip(out_offset - out.pos)
+        out.write(header)
+
+        end = tag_offset + length
+        while tag_offset < end:
+            # keep chunks aligned within the memory tag
+            n = min(end, (tag_offset // CHUNK_SIZE + 1) * CHUNK_SIZE) - tag_offset
+
+            copied = out.copy(src_fd, memory.tag.data_offset + tag_offset, n) if src_fd is not None else 0
+            if copied < n:
+                if src_fd is not None:
+                    # the kernel can't copy between these files, don't try again
+                    src_fd = None
+                out.write_sparse(memory.tag.read(tag_offset + copied, n - copied))
+
+            tag_offset += n
+            done += n
+            if progress is not None:
+                progress(done, total)
+
+    out.finish(size)
+    return size
+
+class ProgressReporter():
+    "prints the export's progress and throughput to a stream, at most every interval seconds"
+    def __init__(self, stream = sys.stderr, interval = 1.0):
+        self.stream = stream
+        self.interval = interval
+        self.start = time.time()
+        self.last = 0
+
+    def __call__(self, done, total):
+        now = time.time()
+        if now - self.last < self.interval and done < total:
+            return
+        self.last = now
+        elapsed = max(now - self.start, 1e-6)
+        self.stream.write("\r{done:.1f}/{total:.1f} MiB ({percent:.1f}%) {rate:.1f} MiB/s".format(done=done / 1048576.0,
+                          total=total / 1048576.0, percent=100.0 * done / max(total, 1), rate=done / 1048576.0 / elapsed))
+        if done >= total:
+            self.stream.write("\n")
+        self.stream.flush()
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(description="Export the guest physical memory of a VMware snapshot (vmsn/vmss)")
+    arg_parser.add_argument("snapshot", help="vmsn/vmss file")
+    arg_parser.add_argument("output", help="output file, or - for stdout")
+    arg_parser.add_argument("-f", "--format", choices=FORMATS, default="raw", help="output format (default: raw)")
+    arg_parser.add_argument("--no-sparse", dest="sparse", action="store_false", help="write zero pages instead of leaving holes, "
+                            "letting the kernel copy uncompressed memory")
+    arg_parser.add_argument("-q", "--quiet", action="store_true", help="don't report progress")
+    arg_parser.add_argument("-v", "--verbose", action="store_true", help="print the parser's debug output")
+    args = arg_parser.parse_args(argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG, stream=sys.stderr)
+
+    progress = None if args.quiet else ProgressReporter()
+    with open(args.snapshot, "rb") as snapshot_fh:
+        parser = vmsn.Parser(snapshot_fh)
+        if args.output == "-":
+            out_fh = getattr(sys.stdout, "buffer", sys.stdout)
+            export(parser, out_fh, args.format, args.sparse, progress)
+        else:
+            with open(args.output, "wb") as out_fh:
+                export(parser, out_fh, args.format, args.sparse, progress)
+        parser.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+This file fingerprints the guest physical memory saved in VMSN/VMSS files:
+every 4 KiB page of every memory region is hashed, and pages that are all
+zeros are marked in a bitmap.
+
+pages are hashed in large chunks over a thread pool. hashlib releases the
+GIL while hashing a page, so hashing scales with the number of cores.
+the result is a PageHashTable, kept in flat arrays (no per-page objects),
+which can be saved to disk, loaded back and queried by PPN (physical page
+number).
+
+usage: python vmsn_hash.py hash [-a sha1] [-j N] snapshot.vmss table.vmsnhash
+       python vmsn_hash.py info table.vmsnhash
+       python vmsn_hash.py query table.vmsnhash ppn [ppn ...]
+"""
+
+import struct
+import sys
+import time
+import hashlib
+import binascii
+import argparse
+from bisect import bisect_right
+from multiprocessing.pool import ThreadPool
+
+# the vmsn/vmss parser
+import vmsn
+
+DEFAULT_ALGORITHM = "sha1"
+
+# pages are read and hashed in chunks of this size, a chunk is a task of the thread pool
+CHUNK_SIZE = 4 * 1024 * 1024
+
+ZERO_PAGE = b"\x00" * vmsn.PAGE_SIZE
+
+## table file: magic, algorithm name, digest size, region count and page count,
+## followed by the regions (first ppn, page count), the digests and the zero page bitmap
+_TABLE_HEADER = struct.Struct("<8s16sIIQ")
+_TABLE_REGION = struct.Struct("<QQ")
+TABLE_MAGIC = b"VMSNPHT1"
+
+# algorithms with a named constructor in hashlib, which is faster than hashlib.new
+_GUARANTEED = getattr(hashlib, "algorithms_guaranteed", ("md5", "sha1", "sha224", "sha256", "sha384", "sha512"))
+
+def _hash_function(algorithm):
+    "returns a function hashing a buffer into a digest"
+    if algorithm in _GUARANTEED:
+        constructor = getattr(hashlib, algorithm)
+        return lambda data: constructor(data).digest()
+    # raises ValueError for unknown algorithms
+    hashlib.new(algorithm)
+    return lambda data: hashlib.new(algorithm, data).digest()
+
+class PageHashTable():
+    """The digest of every page of guest physical memory, and whether it is all zeros.
+
+    pages are kept as rows, in physical address order: regions is a list of (first ppn, page count) tuples, digests holds
+    digest_size bytes per row and zero_bitmap a bit per row (the lowest bit of the first byte is row 0)."""
+    def __init__(self, algorithm, digest_size, regions, digests = None, zero_bitmap = None):
+        self.algorithm = algorithm
+        self.digest_size = digest_size
+        self.regions = list(regions)
+        self.page_count = sum(count for _, count in self.regions)
+        self.digests = digests if digests is not None else bytearray(self.page_count * digest_size)
+        self.zero_bitmap = zero_bitmap if zero_bitmap is not None else bytearray((self.page_count + 7) // 8)
+
+        # the row of the first page of every region, for ppn lookups
+        self._starts = [first_ppn for first_ppn, _ in self.regions]
+        self._rows = []
+        row = 0
+        for _, count in self.regions:
+            self._rows.append(row)
+            row += count
+
+    def __len__(self):
+        return self.page_count
+
+    def row(self, ppn):
+        "the row of a ppn, or None if it isn't in any region"
+        i = bisect_right(self._starts, ppn) - 1
+        if i < 0:
+            return None
+        first_ppn, count = self.regions[i]
+        if ppn >= first_ppn + count:
+            return None
+        return self._rows[i] + ppn - first_ppn
+
+    def __contains__(self, ppn):
+        return self.row(ppn) is not None
+
+    def digest(self, ppn):
+        "the digest of a page, or None if the ppn isn't in any region"
+        row = self.row(ppn)
+        if row is None:
+            return None
+        return bytes(self.digests[row * self.digest_size:(row + 1) * self.digest_size])
+
+    def is_zero(self, ppn):
+        "whether a page is all zeros, None if the ppn isn't in any region"
+        row = self.row(ppn)
+        if row is None:
+            return None
+        return bool(self.zero_bitmap[row >> 3] & (1 << (row & 7)))
+
+    def ppns(self):
+        "iterates over all ppns, in row order"
+        for first_ppn, count in self.regions:
+            for ppn in range(first_ppn, first_ppn + count):
+                yield ppn
+
+    def zero_count(self):
+        "the number of zero pages"
+        return sum(bin(byte).count("1") for byte in self.zero_bitmap)
+
+    def find(self, digest):
+        "returns the ppns of all pages with the given digest"
+        ppns = []
+        pos = self.digests.find(digest)
+        while pos != -1:
+            # only matches on a digest boundary count
+            if pos % self.digest_size == 0:
+                ppns.append(self._ppn(pos // self.digest_size))
+                pos = self.digests.find(digest, pos + self.digest_size)
+            else:
+                pos = self.digests.find(digest, pos + 1)
+        return ppns
+
+    def _ppn(self, row):
+        i = bisect_right(self._rows, row) - 1
+        return self.regions[i][0] + row - self._rows[i]
+
+    def save(self, fh):
+        "writes the table to a binary file object"
+        algorithm = self.algorithm.encode("ascii")
+        fh.write(_TABLE_HEADER.pack(TABLE_MAGIC, algorithm, self.digest_size, len(self.regions), self.page_count))
+        fh.write(b"".join(_TABLE_REGION.pack(first_ppn, count) for first_ppn, count in self.regions))
+        fh.write(self.digests)
+        fh.write(self.zero_bitmap)
+
+    @classmethod
+    def load(cls, fh):
+        "reads a table written by save"
+        header = fh.read(_TABLE_HEADER.size)
+        if len(header) != _TABLE_HEADER.size:
+            raise ValueError("Page hash table is truncated")
+        magic, algorithm, digest_size, region_count, page_count = _TABLE_HEADER.unpack(header)
+        if magic != TABLE_MAGIC:
+            raise ValueError("Not a page hash table", magic)
+
+        data = fh.read(region_count * _TABLE_REGION.size)
+        regions = [_TABLE_REGION.unpack_from(data, i * _TABLE_REGION.size) for i in range(0, region_count)]
+        digests = bytearray(fh.read(page_count * digest_size))
+        zero_bitmap = bytearray(fh.read((page_count + 7) // 8))
+        if len(digests) != page_count * digest_size or len(zero_bitmap) != (page_count + 7) // 8:
+            raise ValueError("Page hash table is truncated")
+        table = cls(algorithm.rstrip(b"\x00").decode("ascii"), digest_size, regions, digests, zero_bitmap)
+        if table.page_count != page_count:
+            raise ValueError("Page hash table is corrupt, region pages don't add up", page_count)
+        return table
+
+def _hash_chunk(task):
+    "hashes the pages of a chunk of the memory tag, returning the chunk's first row, digests and zero rows"
+    tag, hash_page, zero_digest, row, tag_offset, size = task
+    data = tag.read(tag_offset, size, copy=False)
+    try:
+        digests = []
+        zero_rows = []
+        for page_offset in range(0, size, vmsn.PAGE_SIZE):
+            page = data[page_offset:page_offset + vmsn.PAGE_SIZE]
+            if len(page) < vmsn.PAGE_SIZE:
+                # a partial last page is hashed as if it were zero padded
+                page = page.tobytes() + ZERO_PAGE[len(page):]
+            digest = hash_page(page)
+            if digest == zero_digest:
+                zero_rows.append(row + page_offset // vmsn.PAGE_SIZE)
+            digests.append(digest)
+    finally:
+        # don't keep the file's memory map exported
+        if hasattr(data, "release"):
+            data.release()
+    return row, b"".join(digests), zero_rows
+
+def hash_pages(parser, algorithm = DEFAULT_ALGORITHM, workers = None, chunk_size = CHUNK_SIZE, progress = None):
+    """Hashes every page of a parsed snapshot's guest physical memory, returning a PageHashTable.
+
+    algorithm is any hashlib algorithm, workers the number of threads (the number of cpus by default).
+    progress, if given, is called as progress(pages done, total pages) after every chunk."""
+    hash_page = _hash_function(algorithm)
+    zero_digest = hash_page(ZERO_PAGE)
+    chunk_size = max(vmsn.PAGE_SIZE, chunk_size // vmsn.PAGE_SIZE * vmsn.PAGE_SIZE)
+
+    memory = vmsn.PhysicalMemory(parser)
+    regions = [(memory_offset // vmsn.PAGE_SIZE, (length + vmsn.PAGE_SIZE - 1) // vmsn.PAGE_SIZE)
+               for memory_offset, _, length in memory.runs]
+    table = PageHashTable(algorithm, len(zero_digest), regions)
+
+    tasks = []
+    for row, (_, tag_offset, length) in zip(table._rows, memory.runs):
+        for offset in range(0, length, chunk_size):
+            tasks.append((memory.tag, hash_page, zero_digest, row + offset // vmsn.PAGE_SIZE, tag_offset + offset,
+                          min(chunk_size, length - offset)))
+
+    done = 0
+    pool = ThreadPool(workers)
+    try:
+        for row, digests, zero_rows in pool.imap_unordered(_hash_chunk, tasks):
+            table.digests[row * table.digest_size:row * table.digest_size + len(digests)] = digests
+            for zero_row in zero_rows:
+                table.zero_bitmap[zero_row >> 3] |= 1 << (zero_row & 7)
+            done += len(digests) // table.digest_size
+            if progress is not None:
+                progress(done, table.page_count)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return table
+
+def load_table(path):
+    with open(path, "rb") as fh:
+        return PageHashTable.load(fh)
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(description="Hash every page of a VMware snapshot's (vmsn/vmss) guest physical memory")
+    commands = arg_parser.add_subparsers(dest="command")
+    hash_command = commands.add_parser("hash", help="hash a snapshot's pages into a table file")
+    hash_command.add_argument("snapshot", help="vmsn/vmss file")
+    hash_command.add_argument("table", help="output table file")
+    hash_command.add_argument("-a", "--algorithm", default=DEFAULT_ALGORITHM, help="hashlib algorithm (default: %(default)s)")
+    hash_command.add_argument("-j", "--jobs", type=int, default=None, help="hashing threads (default: number of cpus)")
+    info_command = commands.add_parser("info", help="summarize a table file")
+    info_command.add_argument("table")
+    query_command = commands.add_parser("query", help="print the digests of pages")
+    query_command.add_argument("table")
+    query_command.add_argument("ppns", nargs="+", help="physical page numbers (decimal or 0x hex)")
+    args = arg_parser.parse_args(argv)
+
+    if args.command == "hash":
+        start = time.time()
+        with open(args.snapshot, "rb") as fh:
+            parser = vmsn.Parser(fh)
+            table = hash_pages(parser, args.algorithm, args.jobs)
+            parser.close()
+        with open(args.table, "wb") as fh:
+            table.save(fh)
+        elapsed = max(time.time() - start, 1e-6)
+        sys.stderr.write("hashed {pages} pages ({zero} zero) in {elapsed:.2f}s ({rate:.1f} MiB/s)\n".format(pages=len(table),
+                         zero=table.zero_count(), elapsed=elapsed, rate=len(table) * vmsn.PAGE_SIZE / 1048576.0 / elapsed))
+    elif args.command == "info":
+        table = load_table(args.table)
+        sys.stdout.write("algorithm: {0}\npages: {1}\nzero pages: {2}\nregions: {3}\n".format(table.algorithm, len(table),
+                         table.zero_count(), len(table.regions)))
+        for first_ppn, count in table.regions:
+            sys.stdout.write("  ppn {0:#x}-{1:#x} ({2} pages)\n".format(first_ppn, first_ppn + count - 1, count))
+    elif args.command == "query":
+        table = load_table(args.table)
+        for ppn in args.ppns:
+            ppn = int(ppn, 0)
+            digest = table.digest(ppn)
+            if digest is None:
+                sys.stdout.write("{0:#x} unmapped\n".format(ppn))
+            else:
+                sys.stdout.write("{0:#x} {1}{2}\n".format(ppn, binascii.hexlify(digest).decode("ascii"),
+                                                          " zero" if table.is_zero(ppn) else ""))
+    else:
+        arg_parser.print_usage()
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+This file scans the guest physical memory saved in VMSN/VMSS files for
+many byte strings and regular expressions at once, reporting every hit
+by its guest physical address.
+
+memory is split into chunks along the memory regions (gaps between
+regions are never scanned), and every chunk is scanned past its end by
+an overlap, so matches crossing a chunk boundary are found too. every
+chunk (with its overlap) is matched as a string of its own: anchors and
+lookbehinds never see the bytes before it, however it is read. chunks
+are scanned by a process pool. every worker maps the snapshot file, so
+they all share the same pages of the OS page cache, and chunks held in a
+single place of an uncompressed memory tag are matched in a view of the
+map, without copying them.
+
+usage: python vmsn_scan.py [-j N] [-s text] [-x hex] [-e regex] snapshot.vmss
+"""
+
+import re
+import sys
+import time
+import binascii
+import argparse
+import multiprocessing
+
+# the vmsn/vmss parser
+import vmsn
+
+# memory is scanned in chunks of this size, a chunk is a task of the process pool
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# regex matches longer than this may be missed when they cross a chunk boundary (byte strings always fit)
+MAX_MATCH_SIZE = 4096
+
+# the CLI prints at most this many bytes of every hit
+MAX_HIT_BYTES = 64
+
+# python 2's re can't match in a memoryview, chunks are copied there
+_ZERO_COPY = bytes is not str
+
+def compile_patterns(patterns):
+    "compiles a list of byte strings (matched literally) and compiled bytes regexes into regexes"
+    regexes = []
+    for pattern in patterns:
+        if isinstance(pattern, bytes):
+            if not pattern:
+                raise ValueError("Empty pattern")
+            regexes.append(re.compile(re.escape(pattern)))
+        elif hasattr(pattern, "finditer"):
+            regexes.append(pattern)
+        else:
+            raise TypeError("Pattern {0!r} should be a byte string or a compiled regex".format(pattern))
+    return regexes
+
+def default_overlap(patterns):
+    "the overlap needed to find every match crossing a chunk boundary: the longest byte string, or MAX_MATCH_SIZE for regexes"
+    if all(isinstance(pattern, bytes) for pattern in patterns):
+        return max(len(pattern) for pattern in patterns) - 1 if patterns else 0
+    return MAX_MATCH_SIZE - 1
+
+def chunk_ranges(memory, chunk_size = CHUNK_SIZE, overlap = 0):
+    """splits the mapped physical memory of a PhysicalMemory into (start, end, scan end) chunks. a chunk reports the matches
+    starting before its end, and is scanned up to its scan end (overlap bytes later, within the same mapped range)"""
+    ranges = []
+    for paddr, length in memory.ranges():
+        # regions that are adjacent in physical memory are scanned as one
+        if ranges and ranges[-1][1] == paddr:
+            ranges[-1][1] += length
+        else:
+            ranges.append([paddr, paddr + length])
+
+    for range_start, range_end in ranges:
+        for start in range(range_start, range_end, chunk_size):
+            end = min(start + chunk_size, range_end)
+            yield start, end, min(end + overlap, range_end)
+
+def scan_chunk(memory, regexes, chunk):
+    "returns the (physical address, pattern number, matched bytes) hits of a single chunk, sorted by address"
+    start, end, scan_end = chunk
+    segments = list(memory.segments(start, scan_end - start))
+    if len(segments) == 1 and segments[0][1] is not None:
+        # held in one place of the memory tag, a view of the file's map when it is mapped (and the tag isn't compressed)
+        buf = memory.tag.read(segments[0][1], scan_end - start, copy=not _ZERO_COPY)
+    else:
+        buf = memory.zread(start, scan_end - start)
+
+    hits = []
+    try:
+        for pattern_i, regex in enumerate(regexes):
+            for match in regex.finditer(buf):
+                paddr = start + match.start()
+                if paddr >= end:
+                    # in the overlap, the next chunk reports it
+                    break
+                hits.append((paddr, pattern_i, bytes(match.group())))
+    finally:
+        # don't keep the file's memory map exported
+        if hasattr(buf, "release"):
+            buf.release()
+    hits.sort()
+    return hits
+
+def scan_memory(memory, patterns, chunk_size = CHUNK_SIZE, overlap = None):
+    "scans a PhysicalMemory in this process, yielding (physical address, pattern number, matched bytes) hits in address order"
+    regexes = compile_patterns(patterns)
+    if overlap is None:
+        overlap = default_overlap(patterns)
+    for chunk in chunk_ranges(memory, chunk_size, overlap):
+        for hit in scan_chunk(memory, regexes, chunk):
+            yield hit
+
+## worker processes
+_worker_memory = None
+_worker_regexes = None
+
+def _init_worker(path, regexes, use_mmap):
+    global _worker_memory, _worker_regexes
+    # the file stays open (and mapped) for the worker's lifetime
+    _worker_memory = vmsn.PhysicalMemory(vmsn.Parser(open(path, "rb"), use_mmap=use_mmap))
+    _worker_regexes = regexes
+
+def _scan_task(chunk):
+    return scan_chunk(_worker_memory, _worker_regexes, chunk)
+
+def scan(path, patterns, processes = None, chunk_size = CHUNK_SIZE, overlap = None, use_mmap = True):
+    """Scans the guest physical memory of a snapshot file for patterns, over a process pool of the given size (the number of
+    cpus by default, 1 scans in this process). patterns are byte strings (matched literally) and compiled bytes regexes.
+
+    yields (physical address, pattern number, matched bytes) hits in address order. regex matches are found the way finditer
+    finds them, non overlapping per pattern, and ones longer than overlap (MAX_MATCH_SIZE by default) may be missed when they
+    cross a chunk boundary."""
+    regexes = compile_patterns(patterns)
+    if overlap is None:
+        overlap = default_overlap(patterns)
+
+    with open(path, "rb") as fh:
+        memory = vmsn.PhysicalMemory(vmsn.Parser(fh, use_mmap=use_mmap))
+        chunks = list(chunk_ranges(memory, chunk_size, overlap))
+        if processes == 1:
+            for chunk in chunks:
+                for hit in scan_chunk(memory, regexes, chunk):
+                    yield hit
+            memory.parser.close()
+            return
+        memory.parser.close()
+
+    pool = multiprocessing.Pool(processes, _init_worker, (path, regexes, use_mmap))
+    try:
+        # imap keeps the chunks in order, so hits come out sorted
+        for hits in pool.imap(_scan_task, chunks):
+            for hit in hits:
+                yield hit
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _to_bytes(text):
+    return text if isinstance(text, bytes) else text.encode("utf-8")
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(description="Scan the guest physical memory of a VMware snapshot (vmsn/vmss) for patterns")
+    arg_parser.add_argument("snapshot", help="vmsn/vmss file")
+    arg_parser.add_argument("-s", "--string", dest="strings", action="append", default=[], help="byte string to find (utf-8)")
+    arg_parser.add_argument("-x", "--hex", dest="hexes", action="append", default=[], help="byte string to find, in hex")
+    arg_parser.add_argument("-e", "--regex", dest="regexes", action="append", default=[], help="regular expression to find")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: number of cpus)")
+    arg_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE // (1024 * 1024), help="chunk size in MiB (default: %(default)s)")
+    arg_parser.add_argument("--overlap", type=int, default=None, help="bytes scanned past every chunk's end (default: longest match)")
+    args = arg_parser.parse_args(argv)
+
+    # (pattern, how it's printed)
+    specs = [(_to_bytes(text), text) for text in args.strings]
+    for text in args.hexes:
+        try:
+            specs.append((binascii.unhexlify(text.replace(" ", "")), text))
+        except (TypeError, ValueError):
+            arg_parser.error("invalid hex string {0}".format(text))
+    for text in args.regexes:
+        try:
+            specs.append((re.compile(_to_bytes(text)), text))
+        except re.error as e:
+            arg_parser.error("invalid regex {0}: {1}".format(text, e))
+    if not specs:
+        arg_parser.error("no patterns given")
+
+    start = time.time()
+    count = 0
+    patterns = [pattern for pattern, _ in specs]
+    for paddr, pattern_i, data in scan(args.snapshot, patterns, args.jobs, args.chunk_size * 1024 * 1024, args.overlap):
+        sys.stdout.write("{0:#014x} {1} {2}\n".format(paddr, specs[pattern_i][1], binascii.hexlify(data[:MAX_HIT_BYTES]).decode("ascii")))
+        count += 1
+    sys.stderr.write("{0} hits in {1:.1f}s\n".format(count, time.time() - start))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
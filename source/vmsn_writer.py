@@ -0,0 +1,242 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+This file writes synthetic files in VMWare's VMSN/VMSS file format,
+the way the vmsn Parser reads them.
+Real snapshots are huge and can't be shared, so this is used to create
+files of any shape (versions, group and tag counts, index depths, memory
+regions, compressed and multi-GB sparse tags) for testing and benchmarks.
+"""
+
+import struct
+import zlib
+
+# the vmsn/vmss parser
+import vmsn
+
+# the magic of every format version
+VERSION_MAGICS = dict((version, magic) for magic, version in vmsn.MAGICS.items())
+
+# sparse data is generated (and compressed) in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+_ZERO_CHUNK = b"\x00" * CHUNK_SIZE
+
+class SparseData():
+    """Tag data that is mostly zeros: size bytes, with data only at the (offset, bytes) pieces given.
+    uncompressed sparse data is written by seeking over the zeros, so multi-GB tags only take the disk space of the pieces."""
+    def __init__(self, size, pieces = ()):
+        self.size = size
+        self.pieces = sorted(pieces)
+
+    def __len__(self):
+        return self.size
+
+    def chunks(self):
+        "yields the data, zeros included, in chunks of up to CHUNK_SIZE bytes"
+        pos = 0
+        for offset, data in self.pieces + [(self.size, b"")]:
+            while pos < offset:
+                n = min(CHUNK_SIZE, offset - pos)
+                yield _ZERO_CHUNK[:n]
+                pos += n
+            if data:
+                yield data
+                pos += len(data)
+
+class GroupWriter():
+    "collects the tags of a group, in the order they are written"
+    def __init__(self, name):
+        self.name = name
+        self.tags = []
+
+    def tag(self, name, data, indices = (), compressed = False, compress_block = None, long_form = False):
+        """adds a tag. data is either bytes or SparseData, indices is a tuple of up to 3 ints.
+        compressed tags are written with size code 63, as a single zlib stream or, given compress_block, as a stream per block.
+        long_form writes the sizes explicitly (size code 62) even for data shorter than 62 bytes"""
+        if len(indices) > 3:
+            raise ValueError("Tags have at most 3 indices", indices)
+        self.tags.append((name, tuple(indices), data, compressed, compress_block, long_form))
+        return self
+
+class SnapshotWriter():
+    """Writes a vmsn/vmss file: the header, the group directory and every group's tag list.
+
+    usage:
+        writer = SnapshotWriter(version=2)
+        writer.group("cpu").tag("CR", struct.pack("=Q", cr3), indices=(0, 3))
+        with open("test.vmss", "wb") as fh:
+            writer.write(fh)"""
+    def __init__(self, version = 2):
+        if version not in VERSION_MAGICS:
+            raise ValueError("Unknown format version", version)
+        self.version = version
+        self.offset_size = 4 if version == 0 else 8
+        self.groups = []
+
+    def group(self, name):
+        "adds a group and returns its GroupWriter"
+        group = GroupWriter(name)
+        self.groups.append(group)
+        return group
+
+    def write(self, fh):
+        "writes the file to a seekable binary file object"
+        fh.write(struct.pack("=III", VERSION_MAGICS[self.version], 0, len(self.groups)))
+
+        # the directory is written last, once the tags offsets are known
+        pos = vmsn.HEADER_SIZE + len(self.groups) * vmsn.GROUP_SIZE
+        fh.seek(pos)
+        directory = b""
+        for group in self.groups:
+            directory += _encode_name(group.name).ljust(vmsn.GROUP_NAME_SIZE, b"\x00") + struct.pack("=QQ", pos, 0)
+            for tag in group.tags:
+                pos = self._write_tag(fh, pos, *tag)
+            # end of tags marker
+            fh.write(b"\x00\x00")
+            pos += 2
+
+        fh.seek(vmsn.HEADER_SIZE)
+        fh.write(directory)
+        fh.seek(pos)
+        fh.truncate(pos)
+
+    def _write_tag(self, fh, pos, name, indices, data, compressed, compress_block, long_form):
+        "writes a single tag at pos, returning the position right after it"
+        name = _encode_name(name)
+        header = struct.pack("=B", len(name)) + name + b"".join(struct.pack("=I", index) for index in indices)
+        size = len(data)
+        if not (compressed or long_form or size >= 62):
+            fh.write(struct.pack("=B", (len(indices) << 6) | size) + header)
+            fh.write(data)
+            return pos + 1 + len(header) + size
+
+        size_format = "=I" if self.offset_size == 4 else "=Q"
+        if size >= 1 << (self.offset_size * 8):
+            raise ValueError("Tag {0} is too large for format version {1}".format(name, self.version))
+        code = 63 if compressed else 62
+        fh.write(struct.pack("=B", (len(indices) << 6) | code) + header)
+        sizes_pos = pos + 1 + len(header)
+        data_pos = sizes_pos + 2 * self.offset_size + 2
+
+        if compressed:
+            # the compressed size is only known after compressing, write the sizes once it is
+            fh.seek(data_pos)
+            disk_size = 0
+            for chunk in _compress(data, compress_block):
+                fh.write(chunk)
+                disk_size += len(chunk)
+            fh.seek(sizes_pos)
+            fh.write(struct.pack(size_format, disk_size) + struct.pack(size_format, size) + b"\x00\x00")
+            fh.seek(data_pos + disk_size)
+            return data_pos + disk_size
+
+        fh.write(struct.pack(size_format, size) + struct.pack(size_format, size) + b"\x00\x00")
+        if isinstance(data, SparseData):
+            # leave holes for the zeros
+            for offset, piece in data.pieces:
+                fh.seek(data_pos + offset)
+                fh.write(piece)
+            fh.seek(data_pos + size)
+        else:
+            fh.write(data)
+        return data_pos + size
+
+def _encode_name(name):
+    return name.encode("latin-1") if not isinstance(name, bytes) else name
+
+def _compress(data, block_size):
+    "yields the compressed data, as a single zlib stream or as a stream for every block_size bytes"
+    chunks = data.chunks() if isinstance(data, SparseData) else [data]
+    if block_size is None:
+        compressor = zlib.compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk)
+        yield compressor.flush()
+        return
+
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        while len(pending) >= block_size:
+            yield zlib.compress(pending[:block_size])
+            pending = pending[block_size:]
+    if pending:
+        yield zlib.compress(pending)
+
+def build_snapshot(fh, version = 2, vcpus = 1, memory_size = 64 * 1024 * 1024, regions = 1, gap_pages = 256,
+                   marker_interval = 256, groups = 0, tags_per_group = 0, index_depth = 1, large_tag_size = 0,
+                   compressed = False, compress_block = None):
+    """Writes a synthetic snapshot, returning a description of its layout.
+
+    the "cpu" group has CR[vcpu][0..4] for every vcpu (CR3 is vcpu * 0x1000).
+    the "memory" group splits memory_size bytes into regions, with gap_pages unmapped pages between them in physical memory,
+    and holds them in a sparse Memory[0][0] tag. every marker_interval pages, a page starts with its own physical address as
+    a little endian qword, so reads can be verified. compressed (and compress_block) compress the memory tag.
+    groups filler groups ("group0".."groupN") hold tags_per_group tags each, with index_depth levels of indices (16 tags per
+    name at the first level), plus one large_tag_size bytes "blob" tag if it isn't zero.
+
+    the returned dict has the version, the memory runs as (physical address, tag offset, length) tuples and the marker addresses."""
+    writer = SnapshotWriter(version)
+
+    cpu = writer.group("cpu")
+    for vcpu in range(0, vcpus):
+        for register in range(0, 5):
+            value = vcpu * 0x1000 if register == 3 else register
+            cpu.tag("CR", struct.pack("=Q", value), indices=(vcpu, register))
+
+    ## split memory into page aligned regions
+    pages = memory_size // vmsn.PAGE_SIZE
+    regions = max(1, min(regions, pages))
+    runs = []
+    page_num = 0
+    ppn = 0
+    for region_i in range(0, regions):
+        region_pages = pages // regions + (1 if region_i < pages % regions else 0)
+        runs.append((ppn * vmsn.PAGE_SIZE, page_num * vmsn.PAGE_SIZE, region_pages * vmsn.PAGE_SIZE))
+        page_num += region_pages
+        ppn += region_pages + gap_pages
+
+    markers = []
+    pieces = []
+    for memory_offset, tag_offset, length in runs:
+        for page_offset in range(0, length, marker_interval * vmsn.PAGE_SIZE):
+            markers.append(memory_offset + page_offset)
+            pieces.append((tag_offset + page_offset, struct.pack("<Q", memory_offset + page_offset)))
+
+    memory = writer.group("memory")
+    memory.tag("regionsCount", struct.pack("=I", len(runs)))
+    for region_i, (memory_offset, tag_offset, length) in enumerate(runs):
+        memory.tag("regionPPN", struct.pack("=I", memory_offset // vmsn.PAGE_SIZE), indices=(region_i,))
+        memory.tag("regionPageNum", struct.pack("=I", tag_offset // vmsn.PAGE_SIZE), indices=(region_i,))
+        memory.tag("regionSize", struct.pack("=I", length // vmsn.PAGE_SIZE), indices=(region_i,))
+    memory.tag("Memory", SparseData(page_num * vmsn.PAGE_SIZE, pieces), indices=(0, 0),
+               compressed=compressed, compress_block=compress_block)
+
+    for group_i in range(0, groups):
+        group = writer.group("group{0}".format(group_i))
+        for tag_i in range(0, tags_per_group):
+            indices = ((tag_i % 16,) + (0,) * (index_depth - 1)) if index_depth > 0 else ()
+            name = "tag{0}".format(tag_i // 16 if index_depth > 0 else tag_i)
+            group.tag(name, struct.pack("=Q", tag_i), indices=indices)
+        if large_tag_size:
+            group.tag("blob", SparseData(large_tag_size, [(0, b"blob")]), compressed=compressed, compress_block=compress_block)
+
+    writer.write(fh)
+    return {"version": version, "runs": runs, "markers": markers}
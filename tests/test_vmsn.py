@@ -0,0 +1,710 @@
+# VMware snapshot file parser
+# Copyright (C) 2026 the vmsnparser contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+@license:      GNU General Public License 2.0 or later
+
+Tests for the vmsn Parser, run against synthetic snapshots written by vmsn_writer.
+
+every file format version is written with a plain, a compressed (single zlib stream) and a multi-stream compressed
+Memory tag. memory is larger than COMPRESSED_CHECKPOINT_INTERVAL, so compressed reads go through decompressor checkpoints.
+
+usage: python -m unittest discover tests (or python -m pytest tests)
+"""
+
+import os
+import sys
+import json
+import re
+import random
+import shutil
+import struct
+import hashlib
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+# the vmsn/vmss parser
+import vmsn
+import vmsn_writer
+import vmsn_export
+import vmsn_batch
+import vmsn_hash
+import vmsn_diff
+import vmsn_scan
+# asyncio's async/await syntax, python 3.7+
+vmsn_async = None
+if sys.version_info >= (3, 7):
+    import vmsn_async
+from latency_file import LatencyFile
+
+VERSIONS = sorted(vmsn_writer.VERSION_MAGICS)
+# (name, build_snapshot arguments) of every Memory tag layout
+LAYOUTS = (
+    ("plain", {}),
+    ("compressed", {"compressed": True}),
+    ("multi_stream", {"compressed": True, "compress_block": 256 * 1024}),
+)
+MEMORY_SIZE = 36 * 1024 * 1024
+VCPUS = 2
+TAGS_PER_GROUP = 64
+
+_tmp_dir = None
+_snapshots = {}
+
+def setUpModule():
+    global _tmp_dir
+    _tmp_dir = tempfile.mkdtemp(prefix="vmsn_test")
+    for version in VERSIONS:
+        for layout, kwargs in LAYOUTS:
+            path = os.path.join(_tmp_dir, "v{0}_{1}.vmss".format(version, layout))
+            with open(path, "wb") as fh:
+                info = vmsn_writer.build_snapshot(fh, version=version, vcpus=VCPUS, memory_size=MEMORY_SIZE, regions=3,
+                                                  marker_interval=64, groups=2, tags_per_group=TAGS_PER_GROUP,
+                                                  index_depth=2, large_tag_size=100000, **kwargs)
+            _snapshots[version, layout] = (path, info)
+
+def tearDownModule():
+    shutil.rmtree(_tmp_dir)
+
+class SnapshotTests(object):
+    "the tests run against every snapshot, mixed into a TestCase per version and layout (see below)"
+    version = None
+    layout = None
+
+    def setUp(self):
+        self.path, self.info = _snapshots[self.version, self.layout]
+        self.parser = vmsn.Parser(open(self.path, "rb"))
+
+    def tearDown(self):
+        self.parser.close()
+
+    def test_header(self):
+        self.assertEqual(self.parser.version, self.version)
+        self.assertEqual([group.name for group in self.parser], ["cpu", "memory", "group0", "group1"])
+        self.assertTrue("memory" in self.parser)
+        self.assertFalse("nope" in self.parser)
+        self.assertRaises(KeyError, lambda: self.parser["nope"])
+
+    def test_tag_lookups(self):
+        cpu = self.parser["cpu"]
+        for vcpu in range(0, VCPUS):
+            for register in range(0, 5):
+                value = vcpu * 0x1000 if register == 3 else register
+                self.assertEqual(cpu["CR"][vcpu][register].read_long_long(), value)
+        self.assertTrue(isinstance(cpu["CR"][0], vmsn.MetaTag))
+        self.assertFalse("nope" in cpu)
+        self.assertRaises(AttributeError, lambda: cpu["nope"])
+        self.assertRaises(KeyError, lambda: cpu["CR"][VCPUS])
+
+        group = self.parser["group1"]
+        for tag_i in range(0, TAGS_PER_GROUP):
+            tag = group["tag{0}".format(tag_i // 16)][tag_i % 16][0]
+            self.assertEqual(tag.read_long_long(), tag_i)
+        self.assertEqual(group["blob"].size, 100000)
+        self.assertEqual(group["blob"].read(0, 4), b"blob")
+
+    def test_tag_read_bounds(self):
+        tag = self.parser["cpu"]["CR"][1][3]
+        self.assertEqual(tag.read(0, 100), struct.pack("=Q", 0x1000))
+        self.assertEqual(tag.read(4, 100), b"\x00" * 4)
+        self.assertEqual(tag.read(20, 4), b"")
+        blob = self.parser["group0"]["blob"]
+        self.assertEqual(len(blob.read(99990, 100)), 10)
+
+    def test_memory_regions(self):
+        memory = vmsn.PhysicalMemory(self.parser)
+        self.assertEqual(memory.runs, [tuple(run) for run in self.info["runs"]])
+        self.assertEqual(memory.tag.compressed, self.layout != "plain")
+        self.assertEqual(memory.tag.size, MEMORY_SIZE)
+
+    def test_physical_reads(self):
+        memory = vmsn.PhysicalMemory(self.parser)
+        markers = list(self.info["markers"])
+        # out of order, so compressed reads have to go back to earlier checkpoints
+        random.Random(self.version).shuffle(markers)
+        for paddr in markers:
+            self.assertEqual(memory.read(paddr, 8), struct.pack("<Q", paddr))
+            self.assertEqual(memory.read(paddr + 8, 8), b"\x00" * 8)
+        data = memory.read_many([(paddr, 8) for paddr in markers])
+        self.assertEqual(data, [struct.pack("<Q", paddr) for paddr in markers])
+
+    def test_unmapped_reads(self):
+        memory = vmsn.PhysicalMemory(self.parser)
+        run_start, _, run_length = self.info["runs"][0]
+        end = run_start + run_length
+        self.assertFalse(memory.is_valid_address(end))
+        self.assertEqual(memory.read(end, 16), None)
+        self.assertEqual(memory.read(end - 8, 16), None)
+        self.assertEqual(memory.zread(end - 8, 16), b"\x00" * 16)
+        second = self.info["runs"][1][0]
+        self.assertEqual(memory.zread(second - 8, 16), b"\x00" * 8 + struct.pack("<Q", second))
+
+    def test_index_cache(self):
+        cache = vmsn.IndexCache(os.path.join(_tmp_dir, "index"))
+        for _ in range(0, 2):
+            parser = vmsn.Parser(open(self.path, "rb"), index_cache=cache, stats=True)
+            self.assertEqual(parser["cpu"]["CR"][1][3].read_long_long(), 0x1000)
+            self.assertEqual(vmsn.PhysicalMemory(parser).runs, [tuple(run) for run in self.info["runs"]])
+            parser.close()
+        self.assertEqual(parser.stats.index_cache_hits, 1)
+
+class TagTableTests(unittest.TestCase):
+    def table(self, tags):
+        table = vmsn.TagTable()
+        for row, (name, indices) in enumerate(tags):
+            table.append(name, indices, row * 100, 8, 8, False)
+        return table.finish()
+
+    def test_lookups(self):
+        tags = [("a", (2, 1, 7)), ("a", (2, 1, 3)), ("b", ()), ("a", (0, 5, 1)), ("a", (2, 1, 3)), ("c", (0xffffffff,)), ("b", ())]
+        table = self.table(tags)
+        self.assertEqual(table.find("a", (2, 1, 3)), 1)
+        self.assertEqual(table.find("a", (2, 1, 7)), 0)
+        self.assertEqual(table.find("a", (0, 5, 1)), 3)
+        self.assertEqual(table.find("a", (2, 1, 4)), None)
+        self.assertEqual(table.find("a", (2, 2, 3)), None)
+        self.assertEqual(table.find("a", (2, 1)), vmsn.META_TAG)
+        self.assertEqual(table.find("a", (0,)), vmsn.META_TAG)
+        self.assertEqual(table.find("a", (1,)), None)
+        self.assertEqual(table.find("a", ()), vmsn.META_TAG)
+        self.assertEqual(table.find("a", (2, 1, 3, 0)), None)
+        self.assertEqual(table.find("b", ()), 2)
+        self.assertEqual(table.find("b", (0,)), None)
+        self.assertEqual(table.find("c", (0xffffffff,)), 5)
+        self.assertEqual(table.find("c", (1 << 32,)), None)
+        self.assertEqual(table.find("c", (-1,)), None)
+        self.assertEqual(table.find("c", ("x",)), None)
+        self.assertEqual(table.find("d", ()), None)
+        self.assertEqual([table.indices(row) for row in range(0, len(tags))], [indices for _, indices in tags])
+
+    def test_mixed_depths(self):
+        # the first tag in file order wins, whether it is a meta-tag or not
+        table = self.table([("a", (1, 2)), ("a", (1,)), ("a", (3,)), ("a", (3, 4)), ("a", ())])
+        self.assertEqual(table.find("a", (1,)), vmsn.META_TAG)
+        self.assertEqual(table.find("a", (1, 2)), 0)
+        self.assertEqual(table.find("a", (3,)), 2)
+        self.assertEqual(table.find("a", (3, 4)), 3)
+        self.assertEqual(table.find("a", ()), vmsn.META_TAG)
+        self.assertEqual(table.find("a", (2,)), None)
+
+class VirtualMemoryTests(unittest.TestCase):
+    "page tables written into a small snapshot's physical memory"
+    PRESENT = 0x3
+    LARGE = 0x80
+
+    ## x64: PML4 at 0x1000, PDPT 0x2000, PD 0x3000, PT 0x4000
+    USER = 0x00007f0000123000
+    KERNEL = 0xffff800000200000
+    ## pae: PDPT at 0x1020, PD 0x5000, PT 0x6000
+    PAE_USER = 0x00403000
+    PAE_KERNEL = 0xc0200000
+
+    def write(self, efer, cr4, efer_indices = (0,)):
+        memory = {}
+        def entry(table, index, value):
+            memory[table + index * 8] = struct.pack("<Q", value)
+        def page(paddr, text):
+            memory[paddr] = text + b"\x00" * (vmsn.PAGE_SIZE - len(text) - 8) + text[:8]
+
+        ## x64: two 4 KiB pages (not contiguous), a not-present one, one outside of physical memory and a 2 MiB page
+        pml4, pdpt, pd, pt = self.USER >> 39 & 511, self.USER >> 30 & 511, self.USER >> 21 & 511, self.USER >> 12 & 511
+        entry(0x1000, pml4, 0x2000 | self.PRESENT)
+        entry(0x2000, pdpt, 0x3000 | self.PRESENT)
+        entry(0x3000, pd, 0x4000 | self.PRESENT)
+        entry(0x4000, pt, 0x10000 | self.PRESENT)
+        entry(0x4000, pt + 1, 0x8000 | self.PRESENT)
+        entry(0x4000, pt + 2, 0x9000)
+        entry(0x4000, pt + 3, 0x10000000 | self.PRESENT)
+        entry(0x1000, self.KERNEL >> 39 & 511, 0x7000 | self.PRESENT)
+        entry(0x7000, self.KERNEL >> 30 & 511, 0xa000 | self.PRESENT)
+        entry(0xa000, self.KERNEL >> 21 & 511, 0x200000 | self.PRESENT | self.LARGE)
+
+        ## pae: a 4 KiB page and a 2 MiB page
+        entry(0x1020, self.PAE_USER >> 30, 0x5000 | 1)
+        entry(0x5000, self.PAE_USER >> 21 & 511, 0x6000 | self.PRESENT)
+        entry(0x6000, self.PAE_USER >> 12 & 511, 0x10000 | self.PRESENT)
+        entry(0x1020, self.PAE_KERNEL >> 30, 0xb000 | 1)
+        entry(0xb000, self.PAE_KERNEL >> 21 & 511, 0x200000 | self.PRESENT | self.LARGE)
+
+        page(0x10000, b"page at 0x10000.")
+        page(0x8000, b"page at 0x08000.")
+        page(0x9000, b"not present page")
+        page(0x200000, b"large page start")
+        page(0x212000, b"large page +12000")
+
+        writer = vmsn_writer.SnapshotWriter(2)
+        cpu = writer.group("cpu")
+        for register, value in ((0, 0x80000011), (3, 0x1000 if efer else 0x1020), (4, cr4)):
+            cpu.tag("CR", struct.pack("=Q", value), indices=(0, register))
+        cpu.tag("EFER", struct.pack("=Q", efer), indices=efer_indices)
+        writer.group("memory").tag("Memory", vmsn_writer.SparseData(4 * 1024 * 1024, sorted(memory.items())), indices=(0, 0))
+        path = os.path.join(_tmp_dir, "paging.vmss")
+        with open(path, "wb") as fh:
+            writer.write(fh)
+        self.parser = vmsn.Parser(open(path, "rb"))
+        return vmsn.VirtualMemory(self.parser)
+
+    def tearDown(self):
+        self.parser.close()
+
+    def test_x64(self):
+        memory = self.write(0xd01, 0x6f8)
+        self.assertEqual((memory.mode, memory.dtb), ("x64", 0x1000))
+        self.assertEqual(memory.translate(self.USER + 0x10), 0x10010)
+        self.assertEqual(memory.translate(self.USER + 0x1abc), 0x8abc)
+        self.assertEqual(memory.read(self.USER, 16), b"page at 0x10000.")
+        # crossing into the next (not contiguous) page
+        self.assertEqual(memory.read(self.USER + 0xff8, 16), b"page at page at ")
+        # 2 MiB page
+        self.assertEqual(memory.translate(self.KERNEL), 0x200000)
+        self.assertEqual(memory.translate(self.KERNEL + 0x12345), 0x212345)
+        self.assertEqual(memory.read(self.KERNEL + 0x12000, 17), b"large page +12000")
+
+    def test_x64_unmapped(self):
+        memory = self.write(0xd01, 0x6f8)
+        # not present, even though the entry has an address
+        self.assertEqual(memory.translate(self.USER + 0x2000), None)
+        self.assertEqual(memory.read(self.USER + 0x2000, 16), None)
+        self.assertEqual(memory.zread(self.USER + 0x2000, 16), b"\x00" * 16)
+        self.assertEqual(memory.zread(self.USER + 0x1ff8, 16), b"page at " + b"\x00" * 8)
+        # mapped by the page tables, but not in physical memory
+        self.assertEqual(memory.translate(self.USER + 0x3000), 0x10000000)
+        self.assertEqual(memory.read(self.USER + 0x3000, 16), None)
+        # no tables under these, and not canonical
+        self.assertEqual(memory.translate(self.USER + 0x200000), None)
+        self.assertEqual(memory.translate(self.KERNEL - 0x40000000), None)
+        self.assertEqual(memory.translate(0x0000800000000000), None)
+        self.assertFalse(memory.is_valid_address(self.USER + 0x2000))
+
+    def test_tlb(self):
+        memory = self.write(0xd01, 0x6f8)
+        self.assertEqual(memory.translate(self.USER), 0x10000)
+        self.assertEqual((memory.tlb_hits, memory.tlb_misses), (0, 1))
+        self.assertEqual(memory.translate(self.USER + 0x800), 0x10800)
+        self.assertEqual((memory.tlb_hits, memory.tlb_misses), (1, 1))
+        vaddrs = [self.USER + 0x1000, self.KERNEL + 0x5000, self.USER + 0x2000, self.USER + 8]
+        self.assertEqual(memory.translate_many(vaddrs), [0x8000, 0x205000, None, 0x10008])
+        self.assertEqual((memory.tlb_hits, memory.tlb_misses), (2, 4))
+
+    def test_pae(self):
+        memory = self.write(0, 0x6f8)
+        self.assertEqual((memory.mode, memory.dtb), ("pae", 0x1020))
+        self.assertEqual(memory.translate(self.PAE_USER + 0x123), 0x10123)
+        self.assertEqual(memory.read(self.PAE_USER, 16), b"page at 0x10000.")
+        self.assertEqual(memory.translate(self.PAE_KERNEL + 0x12345), 0x212345)
+        self.assertEqual(memory.translate(self.PAE_USER + 0x1000), None)
+        self.assertEqual(memory.translate(1 << 32), None)
+
+    def test_mode_detection(self):
+        # an EFER saved once, without a vcpu index
+        self.assertEqual(self.write(0xd01, 0x6f8, ()).mode, "x64")
+        self.parser.close()
+        self.assertEqual(self.write(0, 0x6f8, ()).mode, "pae")
+        self.parser.close()
+        # neither 4 level nor PAE paging
+        self.assertRaises(vmsn.ParserException, self.write, 0, 0x10)
+        self.parser.close()
+        # EFER with an index too many
+        self.assertRaises(vmsn.ParserException, self.write, 0xd01, 0x6f8, (0, 0))
+
+class BlockCacheTests(unittest.TestCase):
+    "reads through a BlockCache, over a LatencyFile (with no latency) counting the reads that reach the file"
+    def open(self, layout = "plain", **kwargs):
+        path, info = _snapshots[2, layout]
+        fh = LatencyFile(open(path, "rb"), 0)
+        return fh, vmsn.Parser(fh, **kwargs), info
+
+    def test_reads(self):
+        for layout, _ in LAYOUTS:
+            fh, parser, info = self.open(layout, block_size=4096, block_cache_size=256 * 1024)
+            self.assertTrue(parser.block_cache is not None)
+            self.assertEqual(parser["cpu"]["CR"][1][3].read_long_long(), 0x1000)
+            self.assertEqual(parser["group0"]["tag3"][5][0].read_long_long(), 53)
+            memory = vmsn.PhysicalMemory(parser)
+            for paddr in info["markers"]:
+                self.assertEqual(memory.read(paddr, 8), struct.pack("<Q", paddr))
+            parser.close()
+
+    def test_stateful_reads(self):
+        fh, parser, _ = self.open(block_size=4096)
+        parser.seek(0)
+        data = parser.read(12) + parser.read(5000)
+        self.assertEqual(parser.tell(), 5012)
+        with open(_snapshots[2, "plain"][0], "rb") as raw:
+            self.assertEqual(data, raw.read(5012))
+        parser.close()
+
+    def test_sequential_readahead(self):
+        for budget in (64 * 1024, 4 * 1024 * 1024):
+            fh, parser, _ = self.open(block_size=4096, block_cache_size=budget)
+            tag = vmsn.PhysicalMemory(parser).tag
+            reads, bytes_read = fh.reads, fh.bytes_read
+            size = 2 * 1024 * 1024
+            for offset in range(0, size, 4096):
+                tag.read(offset, 4096)
+            # read-ahead fits the budget, so every byte is read from the file about once
+            self.assertTrue(fh.bytes_read - bytes_read <= size + budget, (budget, fh.bytes_read - bytes_read))
+            self.assertTrue(fh.reads - reads < size // 4096 // 4, (budget, fh.reads - reads))
+            self.assertTrue(parser.block_cache.hit_rate() > 0.9)
+            parser.close()
+
+    def test_uncached_reads(self):
+        # the same reads without the block cache reach the file every time
+        fh, parser, _ = self.open(use_mmap=False)
+        self.assertTrue(parser.block_cache is None)
+        reads = fh.reads
+        tag = vmsn.PhysicalMemory(parser).tag
+        for offset in range(0, 64 * 1024, 4096):
+            tag.read(offset, 4096)
+        self.assertTrue(fh.reads - reads >= 16)
+        parser.close()
+
+class CpuStateTests(unittest.TestCase):
+    def setUp(self):
+        writer = vmsn_writer.SnapshotWriter(2)
+        cpu = writer.group("cpu")
+        for vcpu in range(0, 4):
+            for register in range(0, 5):
+                cpu.tag("CR", struct.pack("=Q", vcpu * 0x1000 + register), indices=(vcpu, register))
+            cpu.tag("rip", struct.pack("=Q", 0xfffff80000000000 + vcpu), indices=(vcpu,))
+            cpu.tag("GDTR", b"\x01" * 10, indices=(vcpu,))
+        cpu.tag("NumVCPUs", struct.pack("=I", 4))
+        # the first index of these isn't a vcpu
+        cpu.tag("cpuid", struct.pack("=I", 1), indices=(0x80000008,))
+        cpu.tag("SYSENTER_CS", struct.pack("=Q", 8), indices=(7,))
+        writer.group("memory").tag("Memory", vmsn_writer.SparseData(4096), indices=(0, 0))
+        self.path = os.path.join(_tmp_dir, "cpu.vmss")
+        with open(self.path, "wb") as fh:
+            writer.write(fh)
+        self.parser = vmsn.Parser(open(self.path, "rb"))
+
+    def tearDown(self):
+        self.parser.close()
+
+    def test_registers(self):
+        cpu = vmsn.CpuState(self.parser)
+        self.assertEqual(cpu.vcpu_count, 4)
+        self.assertEqual(cpu["CR"][2][3], 0x2003)
+        self.assertEqual(cpu["CR"].get(3, 4), 0x3004)
+        self.assertEqual(cpu["CR"].get(0, 5), None)
+        self.assertEqual(cpu["rip"][1], 0xfffff80000000001)
+        self.assertEqual(cpu["GDTR"][0], b"\x01" * 10)
+        self.assertEqual(cpu["NumVCPUs"].as_list(), 4)
+        self.assertRaises(KeyError, lambda: cpu["nope"])
+        self.assertRaises(IndexError, lambda: cpu["CR"][4])
+
+    def test_registers_per_vcpu_count(self):
+        # a tag whose first index isn't a vcpu only affects its own register
+        cpu = vmsn.CpuState(self.parser)
+        self.assertEqual(cpu["SYSENTER_CS"].vcpu_count, 8)
+        self.assertEqual(cpu["SYSENTER_CS"][7], 8)
+        self.assertEqual(cpu["CR"].vcpu_count, 4)
+        self.assertRaises(vmsn.ParserException, lambda: cpu["cpuid"])
+        self.assertTrue("cpuid" in cpu)
+        self.assertEqual(sorted(cpu.family(vmsn.OTHER_REGISTERS)), ["GDTR", "NumVCPUs"])
+        self.assertEqual(cpu.vcpu(1)["CR"], [0x1000, 0x1001, 0x1002, 0x1003, 0x1004])
+        self.assertEqual(cpu.vcpu(1)["SYSENTER_CS"], None)
+        self.assertEqual(cpu.vcpu(7), {"NumVCPUs": 4, "SYSENTER_CS": 8})
+
+    def test_export(self):
+        state = json.loads(vmsn.CpuState(self.parser).to_json())
+        self.assertEqual(state["CR"][1], [0x1000, 0x1001, 0x1002, 0x1003, 0x1004])
+        self.assertEqual(state["GDTR"][0], "01" * 10)
+        self.assertFalse("cpuid" in state)
+
+class _Stream(object):
+    "a write only, non-seekable output, like a pipe"
+    def __init__(self):
+        self.data = []
+
+    def write(self, data):
+        self.data.append(bytes(data))
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return b"".join(self.data)
+
+class ExportTests(unittest.TestCase):
+    "exports the memory of the version 2 snapshots, checking every format's segments against the parser's reads"
+    def export(self, layout, format, sparse = True, seekable = True):
+        path, info = _snapshots[2, layout]
+        with open(path, "rb") as fh:
+            parser = vmsn.Parser(fh)
+            if seekable:
+                out_path = os.path.join(_tmp_dir, "export.{0}".format(format))
+                with open(out_path, "wb") as out:
+                    size = vmsn_export.export(parser, out, format, sparse)
+                with open(out_path, "rb") as out:
+                    data = out.read()
+                os.remove(out_path)
+            else:
+                out = _Stream()
+                size = vmsn_export.export(parser, out, format, sparse)
+                data = out.getvalue()
+            memory = vmsn.PhysicalMemory(parser)
+            expected = [memory.read(paddr, length) for paddr, _, length in memory.runs]
+            parser.close()
+        self.assertEqual(len(data), size)
+        return data, info["runs"], expected
+
+    def test_raw(self):
+        for layout, sparse, seekable in (("plain", True, True), ("plain", False, True), ("compressed", True, True), ("plain", True, False)):
+            data, runs, expected = self.export(layout, "raw", sparse, seekable)
+            self.assertEqual(len(data), runs[-1][0] + runs[-1][2])
+            for (paddr, _, length), region in zip(runs, expected):
+                self.assertEqual(data[paddr:paddr + length], region)
+            # the gaps between regions are zeros
+            gap = data[runs[0][0] + runs[0][2]:runs[1][0]]
+            self.assertEqual(gap, b"\x00" * len(gap))
+
+    def test_elf(self):
+        for layout, sparse, seekable in (("plain", False, True), ("multi_stream", True, True), ("plain", True, False)):
+            data, runs, expected = self.export(layout, "elf", sparse, seekable)
+            header = vmsn_export._ELF_HEADER.unpack_from(data, 0)
+            self.assertEqual(header[0][:4], b"\x7fELF")
+            self.assertEqual(header[1], vmsn_export.ET_CORE)
+            self.assertEqual(header[10], len(runs))
+            for i, ((paddr, _, length), region) in enumerate(zip(runs, expected)):
+                phdr = vmsn_export._ELF_PHDR.unpack_from(data, header[5] + i * vmsn_export._ELF_PHDR.size)
+                p_type, _, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, _ = phdr
+                self.assertEqual((p_type, p_paddr, p_filesz, p_memsz), (vmsn_export.PT_LOAD, paddr, length, length))
+                self.assertEqual(data[p_offset:p_offset + p_filesz], region)
+
+    def test_lime(self):
+        for layout, sparse, seekable in (("plain", True, True), ("compressed", False, True), ("compressed", True, False)):
+            data, runs, expected = self.export(layout, "lime", sparse, seekable)
+            pos = 0
+            for (paddr, _, length), region in zip(runs, expected):
+                magic, version, start, end, _ = vmsn_export._LIME_HEADER.unpack_from(data, pos)
+                self.assertEqual((magic, version, start, end), (vmsn_export.LIME_MAGIC, vmsn_export.LIME_VERSION, paddr, paddr + length - 1))
+                pos += vmsn_export._LIME_HEADER.size
+                self.assertEqual(data[pos:pos + length], region)
+                pos += length
+            self.assertEqual(pos, len(data))
+
+class BatchTests(unittest.TestCase):
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "needs named pipes")
+    def test_timeout(self):
+        # opening a named pipe with no writer blocks until the file times out
+        fifo = os.path.join(_tmp_dir, "stuck.vmss")
+        os.mkfifo(fifo)
+        try:
+            paths = [_snapshots[2, "plain"][0], fifo, _snapshots[1, "compressed"][0], os.path.join(_tmp_dir, "missing.vmss")]
+            results = dict((result["path"], result) for result in vmsn_batch.scan(paths, ("version", "memory_size"), timeout=1, processes=2))
+        finally:
+            os.remove(fifo)
+        self.assertEqual(sorted(results), sorted(paths))
+        self.assertTrue(results[fifo]["error"].startswith("timeout after 1s"), results[fifo])
+        self.assertTrue(results[fifo]["elapsed"] >= 1)
+        self.assertTrue("error" in results[paths[3]])
+        # the other files are scanned regardless
+        for path, version in ((paths[0], 2), (paths[2], 1)):
+            self.assertEqual(results[path]["version"], version)
+            self.assertEqual(results[path]["memory_size"], MEMORY_SIZE)
+
+@unittest.skipIf(vmsn_async is None, "needs python 3.7+")
+class AsyncTests(unittest.TestCase):
+    "the coroutines are run one step at a time from the test (without async syntax, which python 2 can't parse)"
+    def setUp(self):
+        self.loop = vmsn_async.asyncio.new_event_loop()
+        # gather, called outside of the loop, uses the current loop
+        vmsn_async.asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        vmsn_async.asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_async(self, *coroutines):
+        if len(coroutines) == 1:
+            return self.loop.run_until_complete(coroutines[0])
+        return self.loop.run_until_complete(vmsn_async.asyncio.gather(*coroutines))
+
+    def test_coalesced_reads(self):
+        path, info = _snapshots[2, "compressed"]
+        parser = self.run_async(vmsn_async.AsyncParser.open(path))
+        tag = self.run_async(parser.tag("group1", "blob"))
+        memory = self.run_async(parser.memory())
+        reads = parser.reads
+
+        # the same tag data and memory, asked for at once, are read once each
+        blobs = self.run_async(*[tag.read() for _ in range(0, 5)])
+        pages = self.run_async(*[memory.read(info["markers"][1], 4096) for _ in range(0, 5)])
+        self.assertEqual(parser.reads - reads, 2)
+        self.assertEqual(parser.coalesced, 8)
+        self.assertEqual(len(set(blobs)), 1)
+        self.assertEqual(blobs[0][:4], b"blob")
+        self.assertEqual(len(blobs[0]), 100000)
+        self.assertEqual(set(pages), set([struct.pack("<Q", info["markers"][1]) + b"\x00" * 4088]))
+
+        # reads that are done aren't shared anymore
+        self.assertEqual(self.run_async(tag.read(0, 4)), b"blob")
+        self.assertEqual(self.run_async(tag.read(0, 4)), b"blob")
+        self.assertEqual(parser.reads - reads, 4)
+        self.run_async(parser.close())
+
+class HashTests(unittest.TestCase):
+    def test_page_hashes(self):
+        for layout in ("plain", "compressed"):
+            path, info = _snapshots[2, layout]
+            with open(path, "rb") as fh:
+                parser = vmsn.Parser(fh)
+                table = vmsn_hash.hash_pages(parser, "sha256", workers=4, chunk_size=1024 * 1024)
+                parser.close()
+            self.check(table, info)
+
+            # and the same after a save and load
+            table_path = os.path.join(_tmp_dir, "table.vmsnhash")
+            with open(table_path, "wb") as fh:
+                table.save(fh)
+            self.check(vmsn_hash.load_table(table_path), info)
+
+    def check(self, table, info):
+        page = vmsn.PAGE_SIZE
+        self.assertEqual(table.algorithm, "sha256")
+        self.assertEqual(len(table), MEMORY_SIZE // page)
+        self.assertEqual(table.regions, [(paddr // page, length // page) for paddr, _, length in info["runs"]])
+        # every page but the markers' is zero (the marker of address 0 is zero too)
+        markers = [paddr for paddr in info["markers"] if paddr]
+        self.assertEqual(table.zero_count(), len(table) - len(markers))
+        zero_digest = hashlib.sha256(b"\x00" * page).digest()
+        self.assertTrue(table.is_zero(0))
+        for paddr in markers:
+            digest = hashlib.sha256(struct.pack("<Q", paddr) + b"\x00" * (page - 8)).digest()
+            self.assertEqual(table.digest(paddr // page), digest)
+            self.assertFalse(table.is_zero(paddr // page))
+            self.assertEqual(table.find(digest), [paddr // page])
+            self.assertEqual(table.digest(paddr // page + 1), zero_digest)
+            self.assertTrue(table.is_zero(paddr // page + 1))
+        # the gap after the first region
+        gap_ppn = (info["runs"][0][0] + info["runs"][0][2]) // page
+        self.assertFalse(gap_ppn in table)
+        self.assertEqual(table.digest(gap_ppn), None)
+        self.assertEqual(table.is_zero(gap_ppn), None)
+
+class DiffTests(unittest.TestCase):
+    "two snapshots of the same machine, with added, removed, changed and unchanged groups, tags and pages"
+    def write(self, name, cr3, devices, extra_group, memory_pages, changed_page):
+        writer = vmsn_writer.SnapshotWriter(2)
+        cpu = writer.group("cpu")
+        for register in range(0, 5):
+            cpu.tag("CR", struct.pack("=Q", cr3 if register == 3 else register), indices=(0, register))
+        cpu.tag("rip", struct.pack("=Q", 0xfffff80000001000), indices=(0,))
+        group = writer.group("devices")
+        for tag_name, data in devices:
+            group.tag(tag_name, data)
+        writer.group(extra_group).tag("x", struct.pack("=I", 1))
+        writer.group("same").tag("blob", b"\x02" * 100)
+        pieces = [(page * vmsn.PAGE_SIZE, struct.pack("<Q", page + (page == changed_page))) for page in range(0, memory_pages)]
+        writer.group("memory").tag("Memory", vmsn_writer.SparseData(memory_pages * vmsn.PAGE_SIZE, pieces), indices=(0, 0))
+        path = os.path.join(_tmp_dir, name)
+        with open(path, "wb") as fh:
+            writer.write(fh)
+        return vmsn.Parser(open(path, "rb"))
+
+    def setUp(self):
+        self.parser_a = self.write("a.vmss", 0x1000, [("a", b"\x01"), ("b", b"\x05" * 100)], "old", 16, None)
+        self.parser_b = self.write("b.vmss", 0x2000, [("a", b"\x01"), ("c", b"\x06" * 2)], "new", 20, 3)
+
+    def tearDown(self):
+        self.parser_a.close()
+        self.parser_b.close()
+
+    def test_state(self):
+        state = vmsn_diff.diff_state(self.parser_a, self.parser_b)
+        self.assertEqual(sorted(state), ["cpu", "devices", "new", "old"])
+        self.assertEqual(state["cpu"], {"added": [], "removed": [], "changed": [{"tag": "CR[0][3]", "old": 0x1000, "new": 0x2000}]})
+        self.assertEqual(state["devices"], {"added": ["c"], "removed": ["b"], "changed": []})
+        self.assertEqual(state["old"], {"added": [], "removed": ["x"], "changed": []})
+        self.assertEqual(state["new"], {"added": ["x"], "removed": [], "changed": []})
+
+    def test_memory(self):
+        expected = {"changed": [[3, 1]], "added": [[16, 4]], "removed": [], "changed_pages": 1, "added_pages": 4, "removed_pages": 0}
+        self.assertEqual(vmsn_diff.diff_memory(self.parser_a, self.parser_b, chunk_size=4 * vmsn.PAGE_SIZE), expected)
+        # and by page digests, computing the missing table
+        table_a = vmsn_hash.hash_pages(self.parser_a, "md5")
+        self.assertEqual(vmsn_diff.diff_memory(self.parser_a, self.parser_b, table_a), expected)
+        # the other way around
+        reverse = vmsn_diff.diff_memory(self.parser_b, self.parser_a)
+        self.assertEqual((reverse["changed"], reverse["added"], reverse["removed"]), ([[3, 1]], [], [[16, 4]]))
+
+class ScanTests(unittest.TestCase):
+    "scans small snapshots for the marker at 0x80000, which chunks of 0x80004 bytes split in half"
+    MARKER = 0x80000
+
+    def setUp(self):
+        self.paths = {}
+        for layout, kwargs in LAYOUTS[:2]:
+            self.paths[layout] = os.path.join(_tmp_dir, "scan_{0}.vmss".format(layout))
+            with open(self.paths[layout], "wb") as fh:
+                vmsn_writer.build_snapshot(fh, memory_size=2 * 1024 * 1024, regions=2, marker_interval=64, **kwargs)
+
+    def scan(self, patterns, layout = "plain", chunk_size = MARKER + 4, **kwargs):
+        return list(vmsn_scan.scan(self.paths[layout], patterns, chunk_size=chunk_size, **kwargs))
+
+    def test_across_chunks(self):
+        marker = struct.pack("<Q", self.MARKER)
+        regex = re.compile(b"\\x08\\x00{5}")
+        expected = [(self.MARKER, 0, marker), (self.MARKER + 2, 1, b"\x08" + b"\x00" * 5)]
+        for layout in ("plain", "compressed"):
+            for use_mmap in (True, False):
+                self.assertEqual(self.scan([marker, regex], layout, processes=1, use_mmap=use_mmap), expected)
+        self.assertEqual(self.scan([marker, regex], processes=2), expected)
+        # a regex overlap too short for its match misses it
+        self.assertEqual(self.scan([regex], processes=1, overlap=1), [])
+
+    def test_read_paths(self):
+        # every chunk is a string of its own, however it is read: ^ matches at the start of the chunk starting at the marker,
+        # and the lookbehind doesn't see the zeros before it
+        patterns = [re.compile(b"^\\x00\\x00\\x08\\x00"), re.compile(b"(?<=\\x00)\\x00\\x00\\x08\\x00")]
+        expected = [(self.MARKER, 0, b"\x00\x00\x08\x00")]
+        for layout in ("plain", "compressed"):
+            for use_mmap in (True, False):
+                self.assertEqual(self.scan(patterns, layout, self.MARKER, processes=1, use_mmap=use_mmap), expected)
+
+class TruncatedFileTests(unittest.TestCase):
+    "a file cut in the middle of its last group's tag list"
+    def setUp(self):
+        self.path = os.path.join(_tmp_dir, "truncated.vmss")
+        with open(self.path, "wb") as fh:
+            vmsn_writer.build_snapshot(fh, memory_size=1024 * 1024, groups=2, tags_per_group=16, large_tag_size=100000)
+            # within group1's blob, so the tag following it can't be read
+            fh.truncate(fh.tell() - 50000)
+        self.cache = vmsn.IndexCache(os.path.join(_tmp_dir, "truncated_index"))
+
+    def test_lazy_failure(self):
+        for index_cache in (None, self.cache):
+            parser = vmsn.Parser(open(self.path, "rb"), index_cache=index_cache)
+            self.assertEqual(parser["cpu"]["CR"][0][1].read_long_long(), 1)
+            self.assertEqual(parser["group0"]["tag0"][3].read_long_long(), 3)
+            self.assertRaises(struct.error, lambda: parser["group1"]["blob"])
+            parser.close()
+        # nothing is cached for a file that couldn't be indexed
+        self.assertFalse(os.path.exists(self.cache.entry_path(self.path)))
+
+# a TestCase for every version and layout, i.e. TestV2Compressed
+for _version in VERSIONS:
+    for _layout, _ in LAYOUTS:
+        _name = "TestV{0}{1}".format(_version, "".join(part.capitalize() for part in _layout.split("_")))
+        globals()[_name] = type(_name, (SnapshotTests, unittest.TestCase), {"version": _version, "layout": _layout})
+
+if __name__ == "__main__":
+    unittest.main()